@@ -0,0 +1,134 @@
+import json
+import os
+
+from inventory import CACHE_DIR, file_digest, write_json_atomic
+
+
+def row_key(item):
+    return f"{item.get('inventory_item_id')}|{item.get('txndate')}"
+
+
+# ----------------- Materialized Aggregates -----------------
+# Description counts behind the "top items" answer, kept up to date by applying
+# per-row deltas instead of rescanning the inventory. `rows` holds each row's
+# description, so a changed or removed row can be subtracted back out.
+class InventoryAggregates:
+    TOP_N = 5
+    # Bumped whenever the persisted state changes meaning, so older caches are
+    # rebuilt instead of trusted. 2: description-only state, and no longer the
+    # empty aggregates saved on a cold start by builds that shared one
+    # records() pass between steps.
+    FORMAT = 2
+
+    def __init__(self, version=None):
+        self.version = version
+        self.rows = {}
+        self.description_counts = {}
+        self._ranked_descriptions = None
+
+    @classmethod
+    def build(cls, items, version=None):
+        aggregates = cls(version)
+        for item in items:
+            aggregates.add(item)
+        return aggregates
+
+    def copy(self):
+        aggregates = InventoryAggregates(self.version)
+        aggregates.rows = dict(self.rows)
+        aggregates.description_counts = dict(self.description_counts)
+        return aggregates
+
+    # ----------- Incremental Updates --------------
+    def add(self, item):
+        key = row_key(item)
+        if key in self.rows:
+            self.remove(item)
+        description = item.get('description')
+        self.rows[key] = description
+        self._count(description, 1)
+
+    def remove(self, item):
+        key = row_key(item)
+        if key not in self.rows:
+            return
+        self._count(self.rows.pop(key), -1)
+
+    def update(self, item):
+        self.add(item)
+
+    def _count(self, description, sign):
+        counts = self.description_counts
+        counts[description] = counts.get(description, 0) + sign
+        if counts[description] == 0:
+            del counts[description]
+        self._ranked_descriptions = None
+
+    # ----------- Queries --------------
+    def most_common_descriptions(self, n=None):
+        if self._ranked_descriptions is None:
+            self._ranked_descriptions = sorted(self.description_counts.items(), key=lambda x: x[1], reverse=True)
+        return self._ranked_descriptions[:n or self.TOP_N]
+
+    # ----------- Persistence --------------
+    def to_dict(self):
+        return {
+            "format": self.FORMAT,
+            "version": self.version,
+            "descriptions": self.rows,
+            "description_counts": self.description_counts,
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        if state.get("format") != cls.FORMAT:
+            raise ValueError(f"aggregates cache format {state.get('format')}, expected {cls.FORMAT}")
+        aggregates = cls(state["version"])
+        aggregates.rows = state["descriptions"]
+        aggregates.description_counts = state["description_counts"]
+        return aggregates
+
+    def save(self, path):
+        write_json_atomic(path, self.to_dict())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r') as file:
+            return cls.from_dict(json.load(file))
+
+    def sync(self, items, version):
+        # Bring a persisted snapshot up to date with a new stock file by
+        # applying only the rows that were added, changed or dropped.
+        seen = set()
+        for item in items:
+            key = row_key(item)
+            seen.add(key)
+            if key not in self.rows or self.rows[key] != item.get('description'):
+                self.add(item)
+        for key in [key for key in self.rows if key not in seen]:
+            item_id, txndate = key.split('|', 1)
+            self.remove({"inventory_item_id": item_id, "txndate": txndate})
+        self.version = version
+        return self
+
+
+def aggregates_path(path):
+    name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(os.path.dirname(os.path.abspath(path)), CACHE_DIR, f"{name}.aggregates.json")
+
+def load_aggregates(path, items):
+    version = file_digest(path)
+    cache_path = aggregates_path(path)
+    try:
+        aggregates = InventoryAggregates.load(cache_path)
+    except (OSError, ValueError, KeyError):
+        aggregates = None
+
+    if aggregates is not None and aggregates.version == version:
+        return aggregates
+    if aggregates is None:
+        aggregates = InventoryAggregates.build(items, version)
+    else:
+        aggregates.sync(items, version)
+    aggregates.save(cache_path)
+    return aggregates
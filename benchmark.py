@@ -0,0 +1,246 @@
+import argparse
+import json
+import os
+import random
+import re
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from types import SimpleNamespace
+
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+STOCK_FILE = 'cust_stock.json'
+QA_DATASET = 'new_qa_dataset.json'
+
+# Run in a fresh interpreter so imports and every on-disk cache are measured
+# exactly as a new Streamlit process would see them.
+COLD_START = """
+import json, sys, time
+start = time.perf_counter()
+sys.path.insert(0, {root!r})
+from engine import InventoryEngine
+imported = time.perf_counter()
+engine = InventoryEngine.load({path!r})
+done = time.perf_counter()
+print(json.dumps({{"imports": imported - start, "load": done - imported, "total": done - start,
+                  "steps": engine.load_times}}))
+"""
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+def summarize(values):
+    return {
+        "runs": len(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "mean": statistics.fmean(values),
+    }
+
+def latency_summary(seconds):
+    milliseconds = [value * 1000 for value in seconds]
+    return {
+        "count": len(milliseconds),
+        "p50_ms": percentile(milliseconds, 50),
+        "p95_ms": percentile(milliseconds, 95),
+        "p99_ms": percentile(milliseconds, 99),
+        "mean_ms": statistics.fmean(milliseconds),
+    }
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+# ----------------- Startup -----------------
+def cold_start(path):
+    output = subprocess.run([sys.executable, '-c', COLD_START.format(root=ROOT, path=path)],
+                            check=True, capture_output=True, text=True, cwd=os.path.dirname(path))
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+def rerun_overhead(directory, reruns):
+    # Time of the first script run (engine build included) and of plain
+    # reruns afterwards, which should only pay for rendering.
+    from streamlit.testing.v1 import AppTest
+
+    cwd = os.getcwd()
+    os.chdir(directory)
+    try:
+        app = AppTest.from_file(os.path.join(ROOT, 'main.py'), default_timeout=600)
+        app.secrets["GROQ_API_KEY"] = os.environ.get("GROQ_API_KEY", "benchmark")
+        start = time.perf_counter()
+        app.run()
+        first = time.perf_counter() - start
+        times = []
+        for _ in range(reruns):
+            start = time.perf_counter()
+            app.run()
+            times.append(time.perf_counter() - start)
+    finally:
+        os.chdir(cwd)
+    return {"first_run": first, "rerun": summarize(times)}
+
+def startup_benchmark(directory, reruns=20):
+    # "cold" builds every cache from scratch in a scratch copy of the data;
+    # "warm" starts a new process with the .inventory_cache files in place.
+    with tempfile.TemporaryDirectory() as scratch:
+        for name in (STOCK_FILE, QA_DATASET):
+            shutil.copy(os.path.join(directory, name), scratch)
+        cold = cold_start(os.path.join(scratch, STOCK_FILE))
+    warm = cold_start(os.path.join(directory, STOCK_FILE))
+    return {"cold_start": cold, "warm_start": warm, **rerun_overhead(directory, reruns)}
+
+
+# ----------------- Q&A Replay -----------------
+STUB_ANSWER = "⚠️ No matching records found."
+TIERS = {"offline": "offline", "cache": "cache", "llm": "llm"}  # anything else is a keyword handler
+
+
+# Stands in for the Groq client: the prompt is still built from the inventory,
+# only the network round-trip is replaced by an optional fixed delay.
+class StubCompletions:
+    def __init__(self, latency=0.0):
+        self.latency = latency
+
+    def create(self, messages, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        prompt_tokens = sum(len(message["content"]) for message in messages) // 4
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=STUB_ANSWER))],
+                               usage=SimpleNamespace(prompt_tokens=prompt_tokens))
+
+class StubLLMClient:
+    def __init__(self, latency=0.0):
+        self.chat = SimpleNamespace(completions=StubCompletions(latency))
+
+
+def normalize_answer(text):
+    text = re.sub(r'(\d+)\.0\b', r'\1', (text or "").lower())
+    return ' '.join(text.replace('*', ' ').split())
+
+def score_answer(response, expected):
+    # "exact": the reply is the expected answer; "contains": the expected
+    # value (the part after "field:") appears somewhere in the reply.
+    response, expected = normalize_answer(response), normalize_answer(expected)
+    value = expected.split(': ', 1)[-1]
+    return response == expected, value in response
+
+def tier_of(intent):
+    return TIERS.get(intent, "keyword")
+
+def qa_benchmark(directory, limit=None, holdout=0.0, seed=0, llm_latency=0.0):
+    from engine import InventoryEngine
+    from qa_engine import OfflineAnswerEngine, QuestionIndex
+    from response_cache import ResponseCache
+
+    engine = InventoryEngine.load(os.path.join(directory, STOCK_FILE))
+    engine.response_cache = ResponseCache()  # in memory, so replays never touch the real cache
+    with open(os.path.join(directory, QA_DATASET), 'r') as file:
+        dataset = json.load(file)
+
+    if holdout:
+        # Score the offline engine on questions it has not indexed.
+        random.Random(seed).shuffle(dataset)
+        split = int(len(dataset) * (1 - holdout))
+        indexed, dataset = dataset[:split], dataset[split:]
+        question_index = QuestionIndex.build([pair['question'] for pair in indexed],
+                                             [pair['answer'] for pair in indexed], engine.data.index.item_ids())
+        engine.qa_engine = OfflineAnswerEngine(question_index, engine.data, engine.series)
+    if limit:
+        dataset = dataset[:limit]
+
+    client = StubLLMClient(llm_latency)
+    latencies = defaultdict(list)
+    accuracy = defaultdict(lambda: {"count": 0, "exact": 0, "contains": 0})
+    rss_before = peak_rss_mb()
+    started = time.perf_counter()
+    for pair in dataset:
+        query_started = time.perf_counter()
+        response = engine.answer(pair['question'], client=client)
+        latencies[response.intent].append(time.perf_counter() - query_started)
+        exact, contains = score_answer(response.text, pair['answer'])
+        for tier in (tier_of(response.intent), "overall"):
+            accuracy[tier]["count"] += 1
+            accuracy[tier]["exact"] += exact
+            accuracy[tier]["contains"] += contains
+    elapsed = time.perf_counter() - started
+
+    for scores in accuracy.values():
+        scores["exact_rate"] = scores["exact"] / scores["count"]
+        scores["contains_rate"] = scores["contains"] / scores["count"]
+    return {
+        "config": {"queries": len(dataset), "holdout": holdout, "seed": seed, "llm_latency": llm_latency},
+        "load_times": engine.load_times,
+        "seconds": elapsed,
+        "throughput_qps": len(dataset) / elapsed if elapsed else 0.0,
+        "peak_rss_mb": {"before_replay": rss_before, "after_replay": peak_rss_mb()},
+        "latency": {
+            "overall": latency_summary([value for values in latencies.values() for value in values]),
+            **{intent: latency_summary(values) for intent, values in sorted(latencies.items())},
+        },
+        "accuracy": dict(sorted(accuracy.items())),
+        "response_cache": engine.response_cache.stats(),
+    }
+
+def compare_reports(report, baseline, max_slowdown=0.2, max_accuracy_drop=0.01):
+    # Regressions against an earlier report: overall p95 latency growing by
+    # more than `max_slowdown`, or any tier's accuracy dropping.
+    problems = []
+    before, after = baseline["latency"]["overall"]["p95_ms"], report["latency"]["overall"]["p95_ms"]
+    if after > before * (1 + max_slowdown):
+        problems.append(f"overall p95 {before:.2f} ms -> {after:.2f} ms")
+    for tier, scores in baseline["accuracy"].items():
+        current = report["accuracy"].get(tier, {}).get("contains_rate", 0.0)
+        if current < scores["contains_rate"] - max_accuracy_drop:
+            problems.append(f"{tier} accuracy {scores['contains_rate']:.3f} -> {current:.3f}")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inventory chatbot benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+    startup = commands.add_parser("startup", help="cold/warm start time and per-rerun overhead")
+    startup.add_argument("--data-dir", default=ROOT)
+    startup.add_argument("--reruns", type=int, default=20)
+    startup.add_argument("--output", help="write the JSON report here instead of stdout")
+    qa = commands.add_parser("qa", help="replay new_qa_dataset.json with the LLM stubbed")
+    qa.add_argument("--data-dir", default=ROOT)
+    qa.add_argument("--limit", type=int, help="replay only the first N questions")
+    qa.add_argument("--holdout", type=float, default=0.0,
+                    help="fraction of questions left out of the offline index and replayed")
+    qa.add_argument("--seed", type=int, default=0)
+    qa.add_argument("--llm-latency", type=float, default=0.0, help="seconds each stubbed LLM call takes")
+    qa.add_argument("--baseline", help="earlier qa report; exit 1 on latency or accuracy regressions")
+    qa.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    if args.command == "startup":
+        report = startup_benchmark(os.path.abspath(args.data_dir), args.reruns)
+    else:
+        report = qa_benchmark(os.path.abspath(args.data_dir), args.limit, args.holdout, args.seed, args.llm_latency)
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(text + '\n')
+    else:
+        print(text)
+
+    if args.command == "qa" and args.baseline:
+        with open(args.baseline, 'r') as file:
+            problems = compare_reports(report, json.load(file))
+        for problem in problems:
+            print(f"regression: {problem}", file=sys.stderr)
+        if problems:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
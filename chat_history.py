@@ -0,0 +1,68 @@
+from collections import deque
+
+
+PAGE_SIZE = 10
+SIDEBAR_SIZE = 20
+MAX_TURNS = 500
+MAX_CHARS = 1_000_000
+
+
+class ChatTurn:
+    __slots__ = ('query', 'response', 'intent', 'trace')
+
+    def __init__(self, query, response, intent, trace=None):
+        self.query = query
+        self.response = response
+        self.intent = intent
+        self.trace = trace  # the query's trace, until the rerun that renders it
+
+    def size(self):
+        return len(self.query) + len(self.response or "")
+
+
+# ----------------- Chat History -----------------
+# Per-session transcript with hard caps on both the number of turns and the
+# total text kept, dropping the oldest turns first, so a session left open all
+# day stays the same size. Views hand back only the slice that is rendered.
+class ChatHistory:
+    def __init__(self, max_turns=MAX_TURNS, max_chars=MAX_CHARS):
+        self.turns = deque(maxlen=max_turns)
+        self.max_chars = max_chars
+        self.chars = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self.turns)
+
+    def append(self, query, response, intent, trace=None):
+        if len(self.turns) == self.turns.maxlen:
+            self._drop_oldest()
+        turn = ChatTurn(query, response, intent, trace)
+        self.turns.append(turn)
+        self.chars += turn.size()
+        self._trim()
+        return turn
+
+    def set_response(self, turn, response):
+        # Pending turns are filled in once their streamed answer completes.
+        self.chars += len(response or "") - len(turn.response or "")
+        turn.response = response
+        self._trim()
+
+    def _drop_oldest(self):
+        self.chars -= self.turns.popleft().size()
+        self.dropped += 1
+
+    def _trim(self):
+        while self.chars > self.max_chars and len(self.turns) > 1:
+            self._drop_oldest()
+
+    # ----------- Views --------------
+    def latest(self, n):
+        # The last `n` turns, newest first, each with its number in the session.
+        start = max(len(self.turns) - n, 0)
+        for position in range(len(self.turns) - 1, start - 1, -1):
+            yield self.dropped + position + 1, self.turns[position]
+
+    def older_count(self, n):
+        return max(len(self.turns) - n, 0)
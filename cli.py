@@ -0,0 +1,92 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+from dotenv import load_dotenv
+
+from engine import InventoryEngine
+from llm import create_async_client
+
+
+QUERY_FIELDS = ("query", "question", "body", "title")
+ID_FIELDS = ("request_id", "id")
+DEFAULT_CONCURRENCY = 8
+
+
+def read_queries(path):
+    # One JSON object per line; the first of QUERY_FIELDS present is asked,
+    # so requests.jsonl-style files work as they are.
+    records = []
+    with open(path, 'r', encoding='utf-8') as file:
+        for number, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            query = next((record[field] for field in QUERY_FIELDS if record.get(field)), None)
+            if query is None:
+                raise ValueError(f"{path}:{number}: no {'/'.join(QUERY_FIELDS)} field")
+            record_id = next((record[field] for field in ID_FIELDS if field in record), number)
+            records.append((record_id, query))
+    return records
+
+
+# ----------------- Batch Mode -----------------
+# Queries are answered concurrently, at most `concurrency` at a time, and the
+# answers are written in input order.
+async def answer_batch(engine, records, concurrency=DEFAULT_CONCURRENCY, api_key=None):
+    client = create_async_client(api_key)
+    slots = asyncio.Semaphore(concurrency)
+
+    async def answer_one(record_id, query):
+        async with slots:
+            started = time.perf_counter()
+            response = await engine.answer_async(query, client=client)
+            return {"id": record_id, "query": query, "response": response.text, "intent": response.intent,
+                    "snapshot_date": response.snapshot_date, "seconds": round(time.perf_counter() - started, 4)}
+
+    try:
+        return await asyncio.gather(*(answer_one(record_id, query) for record_id, query in records))
+    finally:
+        await client.close()
+
+def write_answers(answers, output):
+    for answer in answers:
+        output.write(json.dumps(answer, ensure_ascii=False) + '\n')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Answer inventory questions without the Streamlit UI")
+    parser.add_argument("--stock-file", default=os.path.join(os.getcwd(), 'cust_stock.json'))
+    commands = parser.add_subparsers(dest="command", required=True)
+    ask = commands.add_parser("ask", help="answer one question")
+    ask.add_argument("query")
+    batch = commands.add_parser("batch", help="answer every question in a JSONL file")
+    batch.add_argument("input")
+    batch.add_argument("--output", help="JSONL file for the answers (default: stdout)")
+    batch.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    api_key = os.getenv("GROQ_API_KEY")
+    engine = InventoryEngine.load(args.stock_file)
+
+    if args.command == "ask":
+        print(engine.answer(args.query, api_key=api_key).text)
+        return
+
+    records = read_queries(args.input)
+    started = time.perf_counter()
+    answers = asyncio.run(answer_batch(engine, records, args.concurrency, api_key))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            write_answers(answers, file)
+    else:
+        write_answers(answers, sys.stdout)
+    print(f"Answered {len(answers)} queries in {time.perf_counter() - started:.2f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,384 @@
+import asyncio
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from search_index import FuzzySearchIndex
+from inventory import CACHE_DIR, load_inventory
+from aggregates import load_aggregates
+from intents import INTENT_MATCHER
+from llm import ERROR_PREFIX, async_groq_response, groq_response, stream_groq_response
+from planner import MAX_CONCURRENT_LLM, answer_plan, merge_answers, needs_llm, plan_query
+from response_cache import ResponseCache
+from qa_engine import OfflineAnswerEngine, load_qa_engine
+from timeseries import AVERAGE_PATTERN, SnapshotSeries, find_dates
+from tracing import TRACER
+
+
+QA_DATASET = 'new_qa_dataset.json'
+
+# `intent` is the keyword intent, or "offline", "cache" or "llm" for the
+# fallback tiers; `snapshot_date` is the txndate snapshot the answer used.
+Response = namedtuple('Response', ['text', 'intent', 'snapshot_date'])
+
+
+# ----------------- Inventory Engine -----------------
+# Everything the chatbot derives from the stock file, built once per process
+# and then only read: the columnar table, the fuzzy index, aggregates,
+# per-txndate snapshots, the offline Q&A engine and the intent matcher. The
+# response cache is the one shared piece that changes, and it locks itself.
+# `answer` is the whole question-to-reply pipeline with no Streamlit state,
+# shared by the app, the HTTP server and the batch CLI.
+class InventoryEngine:
+    def __init__(self, path, data, search_index, aggregates, series, qa_engine, response_cache,
+                 matcher=INTENT_MATCHER, load_times=None):
+        self.path = path
+        self.data = data
+        self.search_index = search_index
+        self.aggregates = aggregates
+        self.series = series
+        self.qa_engine = qa_engine
+        self.response_cache = response_cache
+        self.matcher = matcher
+        self.load_times = load_times or {}
+
+    @property
+    def version(self):
+        return self.aggregates.version
+
+    @classmethod
+    def load(cls, path):
+        directory = os.path.dirname(os.path.abspath(path))
+        load_times = {}
+
+        def timed(name, build):
+            start = time.perf_counter()
+            result = build()
+            load_times[name] = time.perf_counter() - start
+            return result
+
+        data = timed("inventory", lambda: load_inventory(path))
+        # records() is a generator, so each consumer gets its own pass
+        search_index = timed("search_index", lambda: FuzzySearchIndex(data.records()))
+        aggregates = timed("aggregates", lambda: load_aggregates(path, data.records()))
+        series = timed("series", lambda: SnapshotSeries(data))
+        qa_engine = timed("qa_engine", lambda: load_qa_engine(os.path.join(directory, QA_DATASET), data, series))
+        response_cache = timed("response_cache",
+                               lambda: ResponseCache(os.path.join(directory, CACHE_DIR, 'responses.json')))
+        load_times["total"] = sum(load_times.values())
+        return cls(path, data, search_index, aggregates, series, qa_engine, response_cache,
+                   load_times=load_times)
+
+    def apply_delta(self, version, removed, changed, added):
+        # A new engine for the next version of the stock file, built from
+        # this one by applying only the changed rows. `removed` are old row
+        # positions, `changed` maps old positions to their new items and
+        # `added` lists new items. This engine is not modified, so sessions
+        # still holding it keep a consistent view until they pick up the new one.
+        load_times = {}
+
+        def timed(name, build):
+            start = time.perf_counter()
+            result = build()
+            load_times[name] = time.perf_counter() - start
+            return result
+
+        old_rows = {position: self.data.row(position) for position in [*removed, *changed]}
+        data, old_to_new = timed("inventory", lambda: self.data.apply_changes(removed, changed, added))
+        first_added = data.size - len(added)
+        new_rows = {int(old_to_new[position]): item for position, item in changed.items()}
+        new_rows.update((first_added + i, item) for i, item in enumerate(added))
+        search_index = timed("search_index",
+                             lambda: self.search_index.updated(old_rows, new_rows, old_to_new, data.size))
+
+        def update_aggregates():
+            aggregates = self.aggregates.copy()
+            for position in removed:
+                aggregates.remove(old_rows[position])
+            for item in [*changed.values(), *added]:
+                aggregates.update(item)
+            aggregates.version = version
+            return aggregates
+
+        aggregates = timed("aggregates", update_aggregates)
+        # Both are vectorized passes over the new arrays, a few milliseconds
+        series = timed("series", lambda: SnapshotSeries(data))
+        qa_engine = timed("qa_engine",
+                          lambda: OfflineAnswerEngine(self.qa_engine.index, data, series, self.qa_engine.threshold))
+        load_times["total"] = sum(load_times.values())
+        return InventoryEngine(self.path, data, search_index, aggregates, series, qa_engine,
+                               self.response_cache, self.matcher, load_times)
+
+    # ----------- Answering --------------
+    def local_answer(self, query):
+        # Everything that can be answered without Groq. A Response with no
+        # text means the question has to go to the LLM fallback.
+        user_input = query.strip()
+        if user_input == "":
+            return Response(None, None, None)
+
+        with TRACER.trace(user_input):
+            # Lists of items ("compare bleach, caustic soda and ...") are split
+            # into one sub-query per item; a plan that still needs the LLM
+            # for some parts is answered by answer()/answer_async().
+            with TRACER.span("planning"):
+                plan = plan_query(self, user_input)
+            if plan is not None:
+                TRACER.count("queries_total", intent="compound")
+                TRACER.tag("compound")
+                if needs_llm(plan):
+                    return Response(None, "compound", plan.snapshot_date)
+                return Response(merge_answers(plan, [sub.answer for sub in plan.parts]), "compound", plan.snapshot_date)
+
+            with TRACER.span("routing"):
+                intent = self.matcher.route(user_input)
+
+                # Stock figures come from one txndate snapshot: the latest one, or the
+                # last one on or before a date given in the question
+                dates = find_dates(user_input)
+                snapshot = self.series.as_of(dates[-1] if dates else None)
+                snapshot_date = self.series.dates[snapshot] if snapshot is not None else None
+
+            full_response = None  # default response
+
+            if intent is not None:
+                with TRACER.span("aggregation"):
+                    full_response = self.keyword_answer(intent, user_input, dates, snapshot, snapshot_date)
+            else:
+                # Offline answers from the Q&A dataset and the inventory first
+                with TRACER.span("search"):
+                    offline = self.qa_engine.confident_answer(user_input, dates[-1] if dates else None)
+                if offline is not None:
+                    full_response = offline.text
+                    intent = "offline"
+
+            if full_response is None and intent is None:
+                # Fallback: Groq API, unless a near-identical question was
+                # already answered
+                with TRACER.span("cache"):
+                    full_response = self.response_cache.get(user_input, self.aggregates.version)
+                TRACER.count("response_cache_lookups_total", result="miss" if full_response is None else "hit")
+                if full_response is not None:
+                    intent = "cache"
+                else:
+                    TRACER.count("llm_fallbacks_total")
+
+            TRACER.count("queries_total", intent=intent or "llm")
+            TRACER.tag(intent or "llm")
+            return Response(full_response, intent or "llm", snapshot_date)
+
+    def keyword_answer(self, intent, query, dates, snapshot, snapshot_date):
+        # Answers for the keyword intents, read from the requested snapshot.
+        full_response = None
+
+        if intent != "top_items" and snapshot is None:
+            full_response = f"❌ No inventory snapshot found on or before {dates[-1]}."
+
+        # ----- Specific handling for Chemicals only -----
+        elif intent == "chemical":
+            top_index = self.data.argmax('stockvalue', self.series.snapshot_rows(snapshot_date, self.data.index.rows_containing('chemical', ['major', 'description'])))
+
+            if top_index is not None:
+                top_chemical = self.data.row(top_index)
+                desc = top_chemical.get('description', 'Unknown')
+                stock_val = top_chemical.get('stockvalue', '0')
+                qty = top_chemical.get('qty', '0')
+                major = top_chemical.get('major', 'Unknown')
+
+                full_response = (
+                    f"🧪 As of {snapshot_date}, the highest stock value chemical is {desc} with a stock value of {stock_val}, "
+                    f"quantity {qty}, categorized under {major}."
+                )
+            else:
+                full_response = "❌ No chemical items found."
+
+        # ----- Specific handling for Dyes only -----
+        elif intent == "dye":
+            top_index = self.data.argmax('stockvalue', self.series.snapshot_rows(snapshot_date, self.data.index.rows_containing('dye', ['major', 'description'])))
+
+            if top_index is not None:
+                top_dye = self.data.row(top_index)
+                desc = top_dye.get('description', 'Unknown')
+                stock_val = top_dye.get('stockvalue', '0')
+                qty = top_dye.get('qty', '0')
+                major = top_dye.get('major', 'Unknown')
+
+                full_response = (
+                    f"🎨 As of {snapshot_date}, the highest stock value dye is {desc} with a stock value of {stock_val}, "
+                    f"quantity {qty}, categorized under {major}."
+                )
+            else:
+                full_response = "❌ No dye items found."
+
+        # ----- Other Existing Handlers -----
+        elif intent == "stock_count":
+            full_response = f"📦 There are **{self.series.item_count(snapshot_date)} items** in the inventory as of {snapshot_date}."
+
+        elif intent == "stock_value" and len(dates) >= 2 and AVERAGE_PATTERN.search(query):
+            # A month-only start means the whole month: "2021-08" from the 1st
+            start = find_dates(query, month_start=True)[0]
+            average = self.series.average('stockvalue', start, dates[-1])
+            if average is None:
+                full_response = f"❌ No inventory snapshot found between {start} and {dates[-1]}."
+            else:
+                start_date, end_date, count, mean = average
+                full_response = (
+                    f"📊 The average total inventory value over the {count} snapshots from {start_date} "
+                    f"to {end_date} is **{round(mean, 2)}**."
+                )
+
+        elif intent == "stock_value" and len(dates) >= 2:
+            change = self.series.change('stockvalue', dates[0], dates[-1])
+            if change is None:
+                full_response = f"❌ No inventory snapshot found on or before {dates[0]}."
+            else:
+                start_date, before, end_date, after, delta = change
+                full_response = (
+                    f"📈 The total inventory value went from **{before}** on {start_date} "
+                    f"to **{after}** on {end_date}, a change of **{delta:+}**."
+                )
+
+        elif intent == "stock_value":
+            full_response = f"💰 The total value of the entire inventory as of {snapshot_date} is **{self.series.total('stockvalue', snapshot_date)}**."
+
+        elif intent == "top_costing":
+            snapshot_rows = self.series.snapshot_rows(snapshot_date)
+            costly_items = self.data.rows(self.data.top('stockvalue', 5, snapshot_rows[self.data['stockvalue'][snapshot_rows] != 0]))
+            if costly_items:
+                full_response = f"🏆 Top 5 expensive items as of {snapshot_date}:\n\n"
+                for idx, item in enumerate(costly_items, start=1):
+                    desc = item.get('description', 'Unknown')
+                    stock_val = item.get('stockvalue', '0')
+                    qty = item.get('qty', '0')
+                    major = item.get('major', 'Unknown')
+                    full_response += (
+                        f"{idx}. {desc} has stock value {stock_val}, quantity {qty}, category {major}.\n"
+                    )
+            else:
+                full_response = "❌ No costly items found."
+
+        elif intent == "costing":
+            snapshot_rows = self.series.snapshot_rows(snapshot_date)
+            costly_items = self.data.rows(self.data.top('stockvalue', 1, snapshot_rows[self.data['stockvalue'][snapshot_rows] != 0]))
+            if costly_items:
+                highest = costly_items[0]
+                desc = highest.get('description', 'Unknown')
+                stock_val = highest.get('stockvalue', '0')
+                qty = highest.get('qty', '0')
+                major = highest.get('major', 'Unknown')
+                full_response = (
+                    f"💎 As of {snapshot_date}, the most expensive item is {desc} with a stock value of {stock_val}, quantity {qty}, categorized under {major}."
+                )
+            else:
+                full_response = "❌ No costing data found."
+
+        elif intent == "top_items":
+            full_response = "🏆 The following are the top 5 most frequently used items:\n\n"
+            for idx, (desc, count) in enumerate(self.aggregates.most_common_descriptions(5), start=1):
+                full_response += f"{idx}. {desc} has been used {count} times.\n"
+
+        elif intent == "category":
+            full_response = f"🗂️ As of {snapshot_date}, the inventory includes items from the following categories:\n\n"
+            for major, count in self.series.category_counts(snapshot_date).items():
+                full_response += f"- {major} with {count} items.\n"
+
+        elif intent == "bleach":
+            bleach_indices = self.series.snapshot_rows(snapshot_date, self.data.index.rows_containing('bleach', ['description']))
+            count = len(bleach_indices)
+            full_response = f"🧼 There are {count} bleach-related items in the inventory as of {snapshot_date}.\n\n"
+            if count > 0:
+                full_response += "Here are some examples:\n\n"
+                for idx, item in enumerate(self.data.rows(bleach_indices[:10]), start=1):
+                    desc = item.get('description', 'Unknown')
+                    stock_val = item.get('stockvalue', '0')
+                    qty = item.get('qty', '0')
+                    major = item.get('major', 'Unknown')
+                    full_response += (
+                        f"{idx}. {desc} has stock value {stock_val}, quantity {qty}, category {major}.\n"
+                    )
+            else:
+                full_response += "No bleach items found."
+
+        elif intent == "fabric":
+            fabric_indices = self.series.snapshot_rows(snapshot_date, self.data.index.rows_containing('fabric', ['major', 'description']))
+            count = len(fabric_indices)
+            full_response = f"🧵 There are {count} fabric-related items in the inventory as of {snapshot_date}.\n\n"
+            if count > 0:
+                full_response += "Here are some examples:\n\n"
+                for idx, item in enumerate(self.data.rows(fabric_indices[:5]), start=1):
+                    desc = item.get('description', 'Unknown')
+                    stock_val = item.get('stockvalue', '0')
+                    qty = item.get('qty', '0')
+                    major = item.get('major', 'Unknown')
+                    full_response += (
+                        f"{idx}. {desc} has stock value {stock_val}, quantity {qty}, category {major}.\n"
+                    )
+            else:
+                full_response += "No fabric items found."
+
+        return full_response
+
+    def remember(self, query, response):
+        # Keep successful LLM answers for near-identical later questions. The
+        # error can also sit after streamed tokens or in one part of a
+        # compound answer, so it is looked for anywhere in the text.
+        if response and not response.startswith("❌") and ERROR_PREFIX not in response:
+            self.response_cache.put(query, self.version, response)
+
+    def answer(self, query, client=None, api_key=None):
+        with TRACER.trace(query.strip()):
+            response = self.local_answer(query)
+            if response.text is not None or not query.strip():
+                return response
+            return response._replace(text=self.llm_answer(query, response.intent, client, api_key))
+
+    def llm_answer(self, query, intent, client=None, api_key=None):
+        # The Groq part of answer(), for a query whose local answer had no
+        # text; `intent` is the one local_answer() returned.
+        if intent == "compound":
+            # The sync client is shared by worker threads, one per part.
+            async def fan_out():
+                # The default executor would cap the parts at a few per CPU
+                asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(MAX_CONCURRENT_LLM))
+                return await self.answer_compound(query, lambda sub_query: asyncio.to_thread(
+                    groq_response, sub_query, self.data, self.search_index, client=client, api_key=api_key))
+
+            text = asyncio.run(fan_out())
+        else:
+            text = groq_response(query, self.data, self.search_index, client=client, api_key=api_key)
+        self.remember(query, text)
+        return text
+
+    async def answer_async(self, query, client=None, api_key=None):
+        # Local answers take milliseconds and run inline; only the Groq
+        # round-trip is awaited, so concurrent queries overlap on it.
+        with TRACER.trace(query.strip()):
+            response = self.local_answer(query)
+            if response.text is not None or not query.strip():
+                return response
+            if response.intent == "compound":
+                text = await self.answer_compound(query, lambda sub_query: async_groq_response(
+                    sub_query, self.data, self.search_index, client=client, api_key=api_key))
+            else:
+                text = await async_groq_response(query, self.data, self.search_index, client=client, api_key=api_key)
+            self.remember(query, text)
+            return response._replace(text=text)
+
+    async def answer_compound(self, query, ask):
+        # Local parts are answered again from the plan; the LLM parts are
+        # fanned out through `ask` concurrently, so the wait is about that of
+        # the slowest part.
+        plan = plan_query(self, query.strip())
+        if plan is None:
+            return await ask(query)
+        return await answer_plan(plan, ask)
+
+    def stream(self, query, client=None, api_key=None):
+        # Streams the LLM answer for a query whose local answer was empty.
+        TRACER.tag("llm")
+        text = ""
+        for token in stream_groq_response(query, self.data, self.search_index, client=client, api_key=api_key):
+            text += token
+            yield token
+        self.remember(query, text)
@@ -0,0 +1,137 @@
+from collections import deque
+
+
+# ----------------- Keyword Buckets -----------------
+STOCK_VALUE_KEYWORDS = [
+"stock value", "stock val", "stockval", "stok value", "stck value", "inventory value", "invntory value", "inv value", "stock worth",
+"inventory worth", "worth of stock", "inventory money", "stock money", "stok mony", "total stock value", "total value", "tot value", "inv value",
+"stck val", "Stock Value", "STOCK VALUE", "inv val", "inven val", "value of stock", "cost of stock", "stck worth", "whats my stock worth",
+"valuation", "stock valuation", "inventory valuation", "stockprice", "stock price", "inventoryprice", "inventory price", "stock price value",
+"stock money value", "total inven value", "invntry value", "stockworth", "what stock worth", "stock rate", "inventory rate", "stok rate", "inv rate",
+"rate of stock", "inventory rate value", "asset value", "inventory asset value", "stock asset value", "total asset", "stock total value",
+"inventory total value", "stok total val", "stock total worth", "inventory total worth", "stok total worth", "stock price list", "inventory price list",
+"inven price", "list of inventory price", "inventory listing value", "stock listing value", "stock net value", "inventory net value", "net stock worth",
+"net inven worth", "stock gross value", "inventory gross value", "gross stock worth", "gross inven worth", "market value", "stock market value",
+"inv market value", "market stock worth", "market inven worth", "valuation stock", "valuation inventory", "worth stock", "worth inven", "stock total money",
+"inventory total money", "stock funds", "inventory funds", "inventory financials", "stock financials", "stock mony", "inven mony", "valuation mony",
+"val mony", "asset mony", "valuation fund", "invntry funds", "invntry mony", "stockfund", "inventoryfund", "stockfunds", "inventoryfunds", "stock price check",
+"inventory price check"
+]
+
+STOCK_COUNT_KEYWORDS = [
+"stock count", "stk count", "inventory count", "inv count", "total items", "total itm", "tot items", "how many items", "hw many items",
+"items count", "item count", "itm count", "number of items", "no of items", "how many itms", "items quantity", "items qty", "total qty",
+"inventory qty", "stock qty", "no. of items", "no items", "stock number", "inventory number", "num of stock", "number stock", "item stock count",
+"stock item count", "inv item count", "inv stock count", "how many stk", "stk itm count", "items total", "total inv items", "inv total items",
+"total stock items", "total inv stock", "inv stock itm", "count of items", "item counts", "itemscounts", "itmcounts", "stockcounts", "stock counts",
+"inv counts", "inventory counts", "total itm count", "how much items", "how mch items", "quantity of items", "qty items", "item qty", "inventoryqty",
+"stockqty", "totalstockcount", "invstockcount", "itmstockcount", "itmstockqty", "inventoryquantity", "stockquantity", "qtyofstock", "totalnumofitems",
+"totalnumberofitems", "stockitemqty", "invitemqty", "stockitmqty", "inventoryitmqty", "stock itms count", "inv itms count", "how many stock",
+"how many inventory", "stocknum", "inventorynum", "numstock", "numinventory", "totinvitems", "invqty", "stkqty", "stknum", "stkitmnum", "itmnum",
+"itmqty", "itmval", "totalitmqty", "inventoryitmcount", "stockitmcount", "itmcount", "countstock", "countinventory", "inventoryitm", "stockitm",
+"howmanyitms", "howmanystk", "howmanyinventory", "numitms", "numstk", "totalitms", "stkcount", "invcount", "itmcounts"
+]
+
+TOP_ITEMS_KEYWORDS = [
+"top items", "top itm", "top 5", "top five", "top5", "best items", "bset items", "top 10", "top ten", "top 3", "top three", "most used items",
+"mostused items", "top-used items", "frequent items", "frequently used items", "most popular items", "popular items", "hot items", "best selling items",
+"hot selling items", "most common items", "trending items", "trend items", "best in stock", "top in stock", "most in stock", "highest stock",
+"top rated items", "top ranking items", "top ranking", "best ranking", "most selling", "top products", "top prod", "best products", "most used products",
+"top performing items", "high demand items", "top demanded", "high sale items", "top sale", "top sales", "top sale items", "high in demand",
+"fast selling", "fast moving items", "fast move items", "bestsellers", "top sellers", "best sellers", "best-selling", "most wanted items",
+"most searched items", "top search items", "frequently bought items", "fast buy items", "quick sale items", "hotstock", "topstock", "toplisting",
+"hotlisting", "top stocks", "in-demand items", "top preferred", "fav items", "favorite items", "top fav", "top preference", "preferred items",
+"faststock", "trendy items", "trendstock", "trenditems", "most required", "best picks", "hot picks", "most liked items", "liked items", "loved items",
+"most chosen", "chosen items", "chosenstock", "hit items", "top hit", "hottest items", "topfivestock", "topfivethings", "bestinlist", "mostpurchased",
+"most bought items", "popularstock", "popstock", "topselling", "mostpurchaseditems", "mostbuy", "top10stock", "mostdemanded"
+]
+
+CATEGORY_KEYWORDS = ["category", "major", "all majors", "types of items", "item types"]
+CHEMICAL_KEYWORDS = ["chemical", "chemicals", "chemical items","checmi","Chem","Chechi"]
+BLEACH_KEYWORDS = ["bleach", "bleaching agents","bleech","bleech list","bleach listing"]
+FABRIC_KEYWORDS = ["fabric", "fabrics", "fabric types", "textiles", "cloth types"]
+COSTING_KEYWORDS = ["costing", "cost", "amount", "total cost", "high cost", "high costing", "expensive item", "pricey item"]
+TOP_COSTING_KEYWORDS = ["top cost", "top costing", "top 5 cost", "top 5 costing", "high costing items", "expensive items", "top expensive", "high stock value", "high amount"]
+DYE_KEYWORDS = ["dye", "dyes"]
+
+INTENT_KEYWORDS = {
+    "chemical": CHEMICAL_KEYWORDS,
+    "dye": DYE_KEYWORDS,
+    "stock_count": STOCK_COUNT_KEYWORDS,
+    "stock_value": STOCK_VALUE_KEYWORDS,
+    "top_costing": TOP_COSTING_KEYWORDS,
+    "costing": COSTING_KEYWORDS,
+    "top_items": TOP_ITEMS_KEYWORDS,
+    "category": CATEGORY_KEYWORDS,
+    "bleach": BLEACH_KEYWORDS,
+    "fabric": FABRIC_KEYWORDS,
+}
+
+# Routing precedence, highest first. An intent listed in EXCLUSIVE only fires
+# when none of its excluded intents matched as well.
+INTENT_PRECEDENCE = list(INTENT_KEYWORDS)
+EXCLUSIVE = {
+    "chemical": {"dye"},
+    "dye": {"chemical"},
+}
+
+
+# ----------------- Aho-Corasick Matcher -----------------
+# Every keyword of every bucket goes into one automaton, so a message is
+# scanned once no matter how many keywords there are.
+class IntentMatcher:
+    def __init__(self, intent_keywords, precedence=None, exclusive=None):
+        self.precedence = list(precedence or intent_keywords)
+        self.exclusive = exclusive or {}
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [frozenset()]
+
+        outputs = [set()]
+        for intent, keywords in intent_keywords.items():
+            for keyword in keywords:
+                state = 0
+                for char in keyword:
+                    next_state = self.goto[state].get(char)
+                    if next_state is None:
+                        next_state = len(self.goto)
+                        self.goto[state][char] = next_state
+                        self.goto.append({})
+                        self.fail.append(0)
+                        outputs.append(set())
+                    state = next_state
+                outputs[state].add(intent)
+
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+                outputs[next_state] |= outputs[self.fail[next_state]]
+        self.output = [frozenset(intents) for intents in outputs]
+
+    def matches(self, text):
+        found = set()
+        goto, fail, output = self.goto, self.fail, self.output
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found |= output[state]
+        return found
+
+    def route(self, text):
+        found = self.matches(text.lower())
+        for intent in self.precedence:
+            if intent in found and not (self.exclusive.get(intent, set()) & found):
+                return intent
+        return None
+
+
+INTENT_MATCHER = IntentMatcher(INTENT_KEYWORDS, INTENT_PRECEDENCE, EXCLUSIVE)
@@ -0,0 +1,472 @@
+import hashlib
+import json
+import math
+import os
+import re
+import shutil
+import sys
+import tempfile
+from array import array
+from functools import cached_property
+
+import numpy as np
+
+
+CACHE_DIR = '.inventory_cache'
+NUMERIC_COLUMNS = ["qty", "stockvalue", "aging_60", "aging_90", "aging_180", "aging_180plus"]
+INTEGER_COLUMNS = ["organization_id", "inventory_item_id"]
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def write_atomic(path, write, mode='w'):
+    # Every writer gets its own temporary file, so processes saving the same
+    # cache at once never write into each other's; the last rename wins.
+    # `write(file)` fills the open temporary file.
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, mode) as file:
+            write(file)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def write_json_atomic(path, data):
+    write_atomic(path, lambda file: json.dump(data, file, separators=(',', ':')))
+
+def column_value(value, integer=False):
+    # How ColumnBuilder stores a raw JSON value in a numeric column.
+    if integer:
+        return -1 if value is None else int(value)
+    return math.nan if value is None else float(value)
+
+def item_signature(item, columns):
+    # The signature a raw stock item would have as a row of a table with
+    # these columns, so new exports can be compared against loaded rows.
+    signature = []
+    for column in columns:
+        value = item.get(column)
+        if value is not None and column in NUMERIC_COLUMNS:
+            value = float(value)
+        elif value is not None and column in INTEGER_COLUMNS:
+            value = int(value)
+        signature.append(value)
+    return tuple(signature)
+
+def plain_number(value):
+    if value is None or math.isnan(value):
+        return None
+    if float(value).is_integer():
+        return int(value)
+    return float(value)
+
+
+# ----------------- Categorical Column -----------------
+# Repeated strings (major, description, fabtype, uom, ...) are stored once in
+# `categories`; rows only hold a small integer code into that list.
+class Categorical:
+    def __init__(self, categories, codes):
+        self.categories = list(categories)
+        self.lookup = {value: code for code, value in enumerate(self.categories)}
+        self.codes = codes
+        self.lowered = ['' if value is None else str(value).lower() for value in self.categories]
+
+    @classmethod
+    def from_values(cls, values):
+        lookup = {}
+        codes = np.empty(len(values), dtype=np.int32)
+        for i, value in enumerate(values):
+            code = lookup.get(value)
+            if code is None:
+                code = lookup[value] = len(lookup)
+            codes[i] = code
+        return cls(list(lookup), codes)
+
+    def __getitem__(self, i):
+        return self.categories[self.codes[i]]
+
+    def __len__(self):
+        return len(self.codes)
+
+    def matching_codes(self, text):
+        text = text.lower()
+        return [code for code, value in enumerate(self.lowered) if text in value]
+
+
+# ----------------- Streaming Loader -----------------
+# Yields the objects of the top-level "items" array one at a time, so a stock
+# export never has to be materialized as a single Python object graph.
+ITEMS_START = re.compile(r'"items"\s*:\s*\[')
+SEPARATORS = re.compile(r'[\s,]*')
+
+def iter_items(path, chunk_size=1 << 16):
+    decoder = json.JSONDecoder()
+    with open(path, 'r') as file:
+        buffer = ''
+        while True:
+            match = ITEMS_START.search(buffer)
+            if match:
+                buffer = buffer[match.end():]
+                break
+            chunk = file.read(chunk_size)
+            if not chunk:
+                return
+            buffer = buffer[-16:] + chunk
+
+        position = 0
+        eof = False
+        while True:
+            position = SEPARATORS.match(buffer, position).end()
+            if buffer.startswith(']', position):
+                return
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                chunk = file.read(chunk_size)
+                eof = not chunk
+                buffer = buffer[position:] + chunk
+                position = 0
+                continue
+            yield item
+
+
+# Appends items column by column into compact typed buffers. A column that is
+# null in every row is dropped when the table is built.
+class ColumnBuilder:
+    def __init__(self):
+        self.columns = []
+        self.numeric = {}
+        self.categorical = {}
+        self.non_null = set()
+        self.size = 0
+
+    def _add_column(self, column):
+        self.columns.append(column)
+        if column in NUMERIC_COLUMNS:
+            self.numeric[column] = array('d', [math.nan]) * self.size
+        elif column in INTEGER_COLUMNS:
+            self.numeric[column] = array('q', [-1]) * self.size
+        elif self.size:
+            self.categorical[column] = ({None: 0}, array('i', [0]) * self.size)
+        else:
+            self.categorical[column] = ({}, array('i'))
+
+    def append(self, item):
+        for column in item:
+            if column not in self.numeric and column not in self.categorical:
+                self._add_column(column)
+        for column in self.columns:
+            value = item.get(column)
+            if value is not None:
+                self.non_null.add(column)
+            if column in NUMERIC_COLUMNS:
+                self.numeric[column].append(math.nan if value is None else float(value))
+            elif column in INTEGER_COLUMNS:
+                self.numeric[column].append(-1 if value is None else int(value))
+            else:
+                lookup, codes = self.categorical[column]
+                code = lookup.get(value)
+                if code is None:
+                    code = lookup[value] = len(lookup)
+                codes.append(code)
+        self.size += 1
+
+    def extend(self, items):
+        for item in items:
+            self.append(item)
+        return self
+
+    def arrays(self):
+        dtypes = {'d': np.float64, 'q': np.int64}
+        columns = [column for column in self.columns if column in self.non_null]
+        dropped = [column for column in self.columns if column not in self.non_null]
+        numeric = {column: np.frombuffer(values, dtype=dtypes[values.typecode])
+                   for column, values in self.numeric.items() if column in self.non_null}
+        categorical = {}
+        for column, (lookup, codes) in self.categorical.items():
+            if column in self.non_null:
+                categorical[column] = (list(lookup), np.frombuffer(codes, dtype=np.int32))
+        return columns, numeric, categorical, dropped
+
+    def build(self):
+        columns, numeric, categorical, dropped = self.arrays()
+        categorical = {column: Categorical(categories, codes)
+                       for column, (categories, codes) in categorical.items()}
+        return InventoryTable(columns, numeric, categorical, self.size, dropped)
+
+
+# ----------------- Inventory Table -----------------
+class InventoryTable:
+    def __init__(self, columns, numeric, categorical, size, dropped_columns=()):
+        self.columns = list(columns)
+        self.numeric = numeric
+        self.categorical = categorical
+        self.size = size
+        self.dropped_columns = list(dropped_columns)
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, column):
+        if column in self.numeric:
+            return self.numeric[column]
+        return self.categorical[column]
+
+    def row(self, i):
+        i = int(i)
+        record = {}
+        for column in self.columns:
+            if column in self.categorical:
+                record[column] = self.categorical[column][i]
+            elif column in INTEGER_COLUMNS:
+                value = self.numeric[column][i]
+                record[column] = None if value == -1 else int(value)
+            else:
+                record[column] = plain_number(self.numeric[column][i])
+        return record
+
+    def rows(self, indices):
+        return [self.row(i) for i in indices]
+
+    def signature(self, i):
+        # Row contents as a comparable tuple; see item_signature.
+        signature = []
+        for column in self.columns:
+            if column in self.categorical:
+                signature.append(self.categorical[column][i])
+            elif column in INTEGER_COLUMNS:
+                value = int(self.numeric[column][i])
+                signature.append(None if value == -1 else value)
+            else:
+                value = float(self.numeric[column][i])
+                signature.append(None if math.isnan(value) else value)
+        return tuple(signature)
+
+    def records(self):
+        for i in range(self.size):
+            yield self.row(i)
+
+    @cached_property
+    def index(self):
+        return TableIndex(self)
+
+    # ----------- Deltas --------------
+    def apply_changes(self, removed, changed, added):
+        # A new table with rows at the `removed` positions dropped, the rows at
+        # the `changed` positions (position -> item) overwritten and `added`
+        # items appended; this table is left untouched. Surviving rows keep
+        # their order. Returns the table and the old -> new position map, with
+        # -1 for removed rows.
+        keep = np.ones(self.size, dtype=bool)
+        keep[list(removed)] = False
+        old_to_new = np.full(self.size, -1, dtype=np.int64)
+        old_to_new[keep] = np.arange(int(keep.sum()))
+
+        numeric = {}
+        for column, values in self.numeric.items():
+            integer = column in INTEGER_COLUMNS
+            values = np.array(values)
+            for position, item in changed.items():
+                values[position] = column_value(item.get(column), integer)
+            extra = np.array([column_value(item.get(column), integer) for item in added], dtype=values.dtype)
+            numeric[column] = np.concatenate([values[keep], extra])
+
+        categorical = {}
+        for column, old in self.categorical.items():
+            categories = list(old.categories)
+            lookup = dict(old.lookup)
+
+            def code_of(value):
+                code = lookup.get(value)
+                if code is None:
+                    code = lookup[value] = len(categories)
+                    categories.append(value)
+                return code
+
+            codes = np.array(old.codes)
+            for position, item in changed.items():
+                codes[position] = code_of(item.get(column))
+            extra = np.array([code_of(item.get(column)) for item in added], dtype=np.int32)
+            categorical[column] = Categorical(categories, np.concatenate([codes[keep], extra]))
+
+        size = int(keep.sum()) + len(added)
+        return InventoryTable(self.columns, numeric, categorical, size, self.dropped_columns), old_to_new
+
+    # ----------- Aggregations --------------
+    # `rows` is an ascending array of row positions (as returned by the
+    # index); None means the whole table.
+    def argmax(self, column, rows=None):
+        rows = np.arange(self.size) if rows is None else rows
+        if not len(rows):
+            return None
+        return int(rows[np.argmax(np.nan_to_num(self.numeric[column][rows]))])
+
+    def top(self, column, n, rows=None):
+        rows = np.arange(self.size) if rows is None else rows
+        order = np.argsort(-np.nan_to_num(self.numeric[column][rows]), kind='stable')[:n]
+        return rows[order]
+
+
+# ----------------- Secondary Indexes -----------------
+# Value -> row positions, as one argsort of the codes plus offsets per code, so
+# rows for a value are a slice and always come out in table order.
+class ValueIndex:
+    def __init__(self, codes, n_codes):
+        self.order = np.argsort(codes, kind='stable').astype(np.int32)
+        self.offsets = np.zeros(n_codes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(codes, minlength=n_codes), out=self.offsets[1:])
+
+    def rows(self, code):
+        return self.order[self.offsets[code]:self.offsets[code + 1]]
+
+
+class TableIndex:
+    VALUE_COLUMNS = ["major", "fabtype", "txndate", "description"]
+    WORD_COLUMNS = ["description"]
+
+    def __init__(self, table):
+        self.table = table
+        self.values = {}
+        for column in self.VALUE_COLUMNS:
+            if column in table.categorical:
+                categorical = table.categorical[column]
+                self.values[column] = ValueIndex(categorical.codes, len(categorical.categories))
+
+        item_ids, codes = np.unique(table['inventory_item_id'], return_inverse=True)
+        self.item_codes = {item_id: code for code, item_id in enumerate(item_ids.tolist())}
+        self.item_rows = ValueIndex(codes.astype(np.int32), len(item_ids))
+
+        # lowercase word -> codes of the values containing it; words are
+        # interned so each distinct word is stored once
+        self.words = {}
+        for column in self.WORD_COLUMNS:
+            words = {}
+            for code, value in enumerate(table.categorical[column].lowered):
+                for word in set(value.split()):
+                    words.setdefault(sys.intern(word), []).append(code)
+            self.words[column] = words
+
+    def _merge(self, index, codes):
+        if not codes:
+            return np.empty(0, dtype=np.int32)
+        if len(codes) == 1:
+            return index.rows(codes[0])
+        return np.sort(np.concatenate([index.rows(code) for code in codes]))
+
+    def rows(self, column, value):
+        if column == 'inventory_item_id':
+            code = self.item_codes.get(value)
+            return self._merge(self.item_rows, [] if code is None else [code])
+        code = self.table.categorical[column].lookup.get(value)
+        return self._merge(self.values[column], [] if code is None else [code])
+
+    def item_ids(self):
+        return self.item_codes.keys()
+
+    def rows_containing(self, text, columns):
+        # A needle without whitespace can only occur inside a single word, so
+        # only the word vocabulary has to be scanned, not every value.
+        text = text.lower()
+        row_sets = []
+        for column in columns:
+            words = self.words.get(column)
+            if words is not None and text.split() == [text]:
+                codes = sorted({code for word, word_codes in words.items() if text in word for code in word_codes})
+            else:
+                codes = self.table.categorical[column].matching_codes(text)
+            row_sets.append(self._merge(self.values[column], codes))
+        if len(row_sets) == 1:
+            return row_sets[0]
+        return np.unique(np.concatenate(row_sets))
+
+
+# ----------------- Binary Snapshot -----------------
+# One .npy file per column plus meta.json with the column layout and the
+# category lists. Columns are opened with mmap_mode='r', so loading is
+# zero-copy and every worker process shares the same pages.
+def snapshot_dir(path):
+    name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(os.path.dirname(os.path.abspath(path)), CACHE_DIR, f"{name}.snapshot")
+
+def source_signature(path):
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+def write_snapshot(path, directory, table=None):
+    # Built from the stock file, or from an already loaded `table` of it.
+    if table is None:
+        builder = ColumnBuilder().extend(iter_items(path))
+        columns, numeric, categorical, dropped = builder.arrays()
+        size = builder.size
+    else:
+        columns, numeric, dropped, size = table.columns, table.numeric, table.dropped_columns, table.size
+        categorical = {column: (values.categories, values.codes) for column, values in table.categorical.items()}
+    # Written into a directory of this process's own, then swapped in. Workers
+    # starting cold together each write a full snapshot; whichever rename
+    # lands last is kept and the others are discarded. The returned table is
+    # mapped from the files just written, which stay readable after a swap.
+    parent = os.path.dirname(directory)
+    os.makedirs(parent, exist_ok=True)
+    tmp_directory = tempfile.mkdtemp(dir=parent, prefix=os.path.basename(directory) + '.', suffix='.tmp')
+    for column, values in numeric.items():
+        np.save(os.path.join(tmp_directory, f"{column}.npy"), values)
+    for column, (_, codes) in categorical.items():
+        np.save(os.path.join(tmp_directory, f"{column}.npy"), codes)
+    meta = {
+        "source": source_signature(path),
+        "size": size,
+        "columns": columns,
+        "dropped_columns": dropped,
+        "categories": {column: categories for column, (categories, _) in categorical.items()},
+    }
+    with open(os.path.join(tmp_directory, 'meta.json'), 'w') as file:
+        json.dump(meta, file)
+    written = open_snapshot(tmp_directory)[0]
+
+    old_directory = tmp_directory + '.old'
+    try:
+        os.rename(directory, old_directory)
+    except FileNotFoundError:
+        old_directory = None  # first snapshot, or another process moved it first
+    try:
+        os.rename(tmp_directory, directory)
+    except OSError:
+        # Another process put its snapshot in place in between; keep that one.
+        shutil.rmtree(tmp_directory, ignore_errors=True)
+    if old_directory is not None:
+        shutil.rmtree(old_directory, ignore_errors=True)
+    return written
+
+def open_snapshot(directory):
+    with open(os.path.join(directory, 'meta.json'), 'r') as file:
+        meta = json.load(file)
+    numeric = {}
+    categorical = {}
+    for column in meta["columns"]:
+        values = np.load(os.path.join(directory, f"{column}.npy"), mmap_mode='r')
+        if column in meta["categories"]:
+            categorical[column] = Categorical(meta["categories"][column], values)
+        else:
+            numeric[column] = values
+    return InventoryTable(meta["columns"], numeric, categorical, meta["size"], meta["dropped_columns"]), meta
+
+def load_inventory(path):
+    directory = snapshot_dir(path)
+    try:
+        table, meta = open_snapshot(directory)
+        if meta["source"] == source_signature(path):
+            return table
+    except (OSError, ValueError, KeyError):
+        pass
+    return write_snapshot(path, directory)
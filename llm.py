@@ -0,0 +1,269 @@
+import math
+import re
+import threading
+import time
+from contextlib import nullcontext
+
+from groq import AsyncGroq, Groq
+
+from search_index import STOPWORDS, detect_requested_fields, preprocess
+from timeseries import find_dates, latest_rows
+from tracing import TRACER
+
+
+MODEL = "meta-llama/llama-4-scout-17b-16e-instruct"
+CONTEXT_ROWS = 50
+CONTEXT_TOKEN_BUDGET = 3000
+CLIENT_TIMEOUT = 30.0
+CLIENT_MAX_RETRIES = 3
+DEFAULT_COLUMNS = ["inventory_item_id", "description", "major", "fabtype", "qty", "stockvalue",
+                   "aging_60", "aging_90", "aging_180", "aging_180plus", "txndate"]
+KEY_COLUMNS = ["inventory_item_id", "description"]
+ERROR_PREFIX = "❌ Groq API Error"
+
+SYSTEM_PROMPT = """
+You are an Inventory Assistant.
+
+Using ONLY this inventory data (one row per line, first line is the header):
+
+{context}
+
+Rules:
+
+Rules:
+
+1. For Inventory Item Descriptions (e.g., "What is Sulphur Olive Green like?"):
+Use fuzzy search in 'description' and reply like this (natural GPT chat form):
+
+Sure! Here are the matching inventory items I found:
+
+• Sulphur Olive Green with a quantity of 120, stock value 3000, and secqty 20.
+
+• Olive Green Dye with a quantity of 80, stock value 2000, and secqty 10.
+
+If ask for bleech list or kind of any listing show 10 records
+
+(Up to 50 results like this.)
+
+If no match:
+
+⚠️ No matching records found.
+
+2. For Category Questions (e.g., "How many categories are there?"):
+There are two categories: Chemicals and Dyes.
+
+3. For Item Count in Categories (e.g., "How many items in chemicals and dyes?"):
+There are 3145 items in Chemicals and 1255 items in Dyes.
+
+4. For Item Costing/High Value (e.g., "What is the high cost stock?"):
+Use stock_value as cost and reply like:
+
+The highest cost item is Sulphur Blue with a stock value of 50,000.
+
+5. For Aging Queries (e.g., "What has aging 60?"):
+If asked "Show items with aging 60", reply GPT-like:
+
+There are some items that have aging 60. A few are given below:
+
+Bleach White has aging 60 and quantity 45.
+
+Olive Green Dye has aging 60 and quantity 120.
+
+Sulphur Blue has aging 60 and quantity 75.
+
+(Max 50 such records)
+
+If none:
+
+⚠️ No matching records found.
+
+6. Strict No Guessing Rule:
+If nothing matches, reply exactly:
+
+⚠️ No matching records found.
+
+7. Fuzzy Handling:
+Supports misspelling, plurals, slang, typos via fuzzy matching.
+
+8. Always GPT-style (conversational), never show labels like:
+yaml
+Copy
+Edit
+Inventory Item ID: 1234  
+Description: Bleach White  
+Quantity: 200
+Instead, say:
+
+Bleach White with a quantity of 200, stock value 5000, and secqty 50.
+
+Do not guess, assume, or fabricate any data not explicitly present. Only respond based on the above instructions.
+"""
+
+
+def estimate_tokens(text):
+    # Roughly four characters per token for English text and numbers.
+    return math.ceil(len(text) / 4)
+
+
+# ----------------- Retrieval -----------------
+def context_columns(query):
+    columns = list(KEY_COLUMNS)
+    for field in detect_requested_fields(query):
+        for column in field if isinstance(field, list) else [field]:
+            if column not in columns:
+                columns.append(column)
+    if len(columns) == len(KEY_COLUMNS):
+        return list(DEFAULT_COLUMNS)
+    columns.append("txndate")
+    return columns
+
+def retrieve_rows(query, table, index, k=CONTEXT_ROWS):
+    # One row per item, its newest on or before the date in the question (or
+    # its newest overall), so the context is not one item repeated across
+    # snapshots. Items named by id come first, then fuzzy matches by score.
+    dates = find_dates(query)
+    date = dates[-1] if dates else None
+    positions = []
+    for number in re.findall(r'\b\d{3,}\b', query):
+        positions.extend(latest_rows(table, table.index.rows('inventory_item_id', int(number)), date).tolist())
+    keywords = ' '.join(token for token in preprocess(query) if token not in STOPWORDS)
+    scores = dict(index.search(keywords))
+    matches = sorted(latest_rows(table, list(scores), date).tolist(), key=lambda position: -scores[position])
+    for position in matches:
+        if len(positions) >= k:
+            break
+        if position not in positions:
+            positions.append(position)
+    if not positions:
+        positions = table.top('stockvalue', k, latest_rows(table, range(table.size), date)).tolist()
+    return positions[:k]
+
+def encode_rows(rows, columns, token_budget=CONTEXT_TOKEN_BUDGET):
+    def cell(value):
+        if value is None:
+            return ''
+        return str(value).strip().replace('|', '/')
+
+    lines = ['|'.join(columns)]
+    used = estimate_tokens(lines[0])
+    for row in rows:
+        line = '|'.join(cell(row.get(column)) for column in columns)
+        cost = estimate_tokens(line) + 1
+        if used + cost > token_budget:
+            break
+        lines.append(line)
+        used += cost
+    return '\n'.join(lines), len(lines) - 1
+
+def build_messages(query, table, index, token_budget=CONTEXT_TOKEN_BUDGET):
+    with TRACER.span("search"):
+        positions = retrieve_rows(query, table, index)
+    with TRACER.span("prompt_build"):
+        context, row_count = encode_rows(table.rows(positions), context_columns(query), token_budget)
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT.format(context=context)},
+        {"role": "user", "content": query},
+    ]
+    return messages, row_count
+
+
+# ----------------- Groq Client -----------------
+# One client per (api key, base url) for the whole process, so the underlying
+# httpx connection pool is reused across queries and sessions. The SDK retries
+# connection errors, 429s and 5xx responses with exponential backoff.
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_client(api_key=None, base_url=None):
+    key = (api_key, base_url)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = Groq(api_key=api_key, base_url=base_url,
+                                          timeout=CLIENT_TIMEOUT, max_retries=CLIENT_MAX_RETRIES)
+    return client
+
+def create_async_client(api_key=None, base_url=None):
+    # An async client's connection pool belongs to one event loop, so it is
+    # not pooled here: the server and the batch CLI make one per loop.
+    return AsyncGroq(api_key=api_key, base_url=base_url,
+                     timeout=CLIENT_TIMEOUT, max_retries=CLIENT_MAX_RETRIES)
+
+def create_completion(client, messages, stream):
+    return client.chat.completions.create(
+        model=MODEL,
+        messages=messages,
+        temperature=0.2,
+        max_completion_tokens=2048,
+        top_p=1,
+        stream=stream,
+    )
+
+def record_prompt(messages, row_count, usage=None):
+    prompt_tokens = getattr(usage, "prompt_tokens", None)
+    if prompt_tokens is None:
+        prompt_tokens = sum(estimate_tokens(message["content"]) for message in messages)
+    TRACER.count("llm_requests_total")
+    TRACER.count("prompt_tokens_total", prompt_tokens)
+    TRACER.count("context_rows_total", row_count)
+
+
+# ----------------- Groq Fallback -----------------
+def groq_response(query, table, index, client=None, api_key=None):
+    try:
+        if client is None:
+            client = get_client(api_key)
+
+        messages, row_count = build_messages(query, table, index)
+        with TRACER.span("llm"):
+            completion = create_completion(client, messages, stream=False)
+        record_prompt(messages, row_count, getattr(completion, "usage", None))
+        return completion.choices[0].message.content
+
+    except Exception as e:
+        TRACER.count("llm_errors_total")
+        return f"{ERROR_PREFIX}: {e}"
+
+async def async_groq_response(query, table, index, client=None, api_key=None):
+    try:
+        # Without a caller's client a one-off one is opened, and closed again
+        # so its connection pool does not outlive the call.
+        async with create_async_client(api_key) if client is None else nullcontext(client) as client:
+            messages, row_count = build_messages(query, table, index)
+            with TRACER.span("llm"):
+                completion = await create_completion(client, messages, stream=False)
+            record_prompt(messages, row_count, getattr(completion, "usage", None))
+            return completion.choices[0].message.content
+
+    except Exception as e:
+        TRACER.count("llm_errors_total")
+        return f"{ERROR_PREFIX}: {e}"
+
+def stream_groq_response(query, table, index, client=None, api_key=None):
+    try:
+        if client is None:
+            client = get_client(api_key)
+
+        messages, row_count = build_messages(query, table, index)
+        started = time.perf_counter()
+        stream = create_completion(client, messages, stream=True)
+        record_prompt(messages, row_count)
+
+        first_token = True
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            content = chunk.choices[0].delta.content
+            if not content:
+                continue
+            if first_token:
+                TRACER.record("llm_first_token", time.perf_counter() - started)
+                first_token = False
+            yield content
+        # Recorded by hand: a span opened inside a generator would stay open
+        # across every yield back to the caller.
+        TRACER.record("llm", time.perf_counter() - started)
+
+    except Exception as e:
+        TRACER.count("llm_errors_total")
+        yield f"{ERROR_PREFIX}: {e}"
@@ -1,14 +1,12 @@
 import streamlit as st
-import json
-import re
-from difflib import get_close_matches
 import os
+import time
 from dotenv import load_dotenv
 import os
-import random
 from dotenv import load_dotenv
-from groq import Groq
-from collections import Counter
+from refresh import InventoryWatcher
+from chat_history import PAGE_SIZE, SIDEBAR_SIZE, ChatHistory
+from tracing import TRACER
 
 # ----------------- File Path -----------------
 file_path = os.path.join(os.getcwd(),'cust_stock.json')
@@ -20,72 +18,17 @@ st.set_page_config(layout="wide")
 
 load_dotenv()
 GROQ_API_KEY = st.secrets["GROQ_API_KEY"]
-# ----------------- Load JSON Data -----------------
-@st.cache_data
-def load_data(path):
-    with open(path, 'r') as file:
-        data = json.load(file)
-    return data['items']
+# ----------------- Load Inventory Engine -----------------
+# Built once per process and shared read-only by every session and rerun; the
+# watcher swaps in a new engine when the stock file changes
+@st.cache_resource
+def watch_inventory(path):
+    return InventoryWatcher(path).start()
 
-data = load_data(file_path)
-
-# ----------------- Inventory Statistics -----------------
-def get_inventory_statistics(data):
-    total_items = len(data)
-    majors = [item.get('major', 'Unknown') for item in data]
-    major_counts = Counter(majors)
-    return total_items, major_counts
-
-def get_top_items(data, top_n=5):
-    desc_counts = Counter([item.get('description', 'Unknown') for item in data])
-    return desc_counts.most_common(top_n)
-
-total_items, major_counts = get_inventory_statistics(data)
-top_items = get_top_items(data)
+inventory = watch_inventory(file_path)
+engine = inventory.engine  # one engine for the whole rerun
 
 # ----------------- NLP Functions -----------------
-def preprocess(text):
-    text = text.lower()
-    text = re.sub(r'[^a-z0-9\s]', '', text)
-    return text.split()
-
-def fuzzy_token_match(query_tokens, item_tokens):
-    score = 0
-    for q_token in query_tokens:
-        match = get_close_matches(q_token, item_tokens, n=1, cutoff=0.7)
-        if match:
-            score += 1
-    return score
-
-def search_all_matching_items(query, data, min_score=1):
-    query_tokens = preprocess(query)
-    matched_items = []
-    for item in data:
-        combined_text = f"{item.get('description', '')} {item.get('major', '')} {item.get('fabtype', '')}"
-        item_tokens = preprocess(combined_text)
-        score = fuzzy_token_match(query_tokens, item_tokens)
-        if score >= min_score:
-            matched_items.append((item, score))
-    matched_items.sort(key=lambda x: x[1], reverse=True)
-    return matched_items
-
-def detect_requested_fields(query):
-    possible_fields = {
-        "inventory id": "inventory_item_id",
-        "description": "description",
-        "major": "major",
-        "fab type": "fabtype",
-        "qty": "qty",
-        "quantity": "qty",
-        "stock value": "stockvalue",
-        "aging": ["aging_60", "aging_90", "aging_180", "aging_180plus"]
-    }
-    detected = []
-    for key, val in possible_fields.items():
-        if key in query.lower():
-            detected.append(val)
-    return detected
-
 def format_gpt_style_response(item, requested_fields):
     response = "Here are the details:\n\n"
     if requested_fields:
@@ -111,14 +54,21 @@ def format_gpt_style_response(item, requested_fields):
 
 # ----------- Session State --------------
 if 'chat_history' not in st.session_state:
-    st.session_state.chat_history = []
+    st.session_state.chat_history = ChatHistory()
+if 'visible_turns' not in st.session_state:
+    st.session_state.visible_turns = PAGE_SIZE
 if 'user_input' not in st.session_state:
     st.session_state.user_input = ""
 
 # ----------- Sidebar --------------
+# Only the most recent queries; older ones are summarized in a caption
+chat_history = st.session_state.chat_history
 st.sidebar.title("💬 Chat History")
-for idx, hist in enumerate(st.session_state.chat_history):
-    st.sidebar.write(f"{idx+1}. {hist['query']}")
+earlier = chat_history.dropped + max(len(chat_history) - SIDEBAR_SIZE, 0)
+if earlier > 0:
+    st.sidebar.caption(f"… {earlier} earlier questions")
+for idx, turn in reversed(list(chat_history.latest(SIDEBAR_SIZE))):
+    st.sidebar.write(f"{idx}. {turn.query}")
 
 st.title("📦 Stock Inventory Chatbot ")
 st.write("---")
@@ -127,132 +77,74 @@ st.write("---")
 
 input_container = st.container()
 
+def user_bubble(text):
+    return (
+        f"<div style='text-align: right; background-color: #D1E7DD; padding:10px; border-radius:10px; "
+        f"margin:5px 0 5px auto; width: fit-content; max-width: 80%;'>{text}</div>"
+    )
+
+def bot_bubble(text):
+    return (
+        f"<div style='text-align: left; background-color: #F0F0F0; padding:10px; border-radius:10px; "
+        f"margin:5px auto 5px 0; width: fit-content; max-width: 80%; overflow-x: auto;'>{text}</div>"
+    )
+
+
+
+def show_older_turns():
+    st.session_state.visible_turns += PAGE_SIZE
+
+
+# Only the last `visible_turns` turns are rendered on a rerun; older ones are
+# fetched a page at a time with the button below them
+render_started = time.perf_counter()
+streaming = 0.0
+# Taken as a list first: set_response() may trim the oldest turns mid-loop
+for _, chat in list(chat_history.latest(st.session_state.visible_turns)):
+        if chat.response is None:
+            # Groq fallback answers stream into the bubble as tokens arrive
+            stream_started = time.perf_counter()
+            st.markdown(user_bubble(chat.query), unsafe_allow_html=True)
+            bot_message = st.empty()
+            response = ""
+            with TRACER.resume(chat.trace):
+                if chat.intent == "compound":
+                    # One Groq call per unresolved item, all in flight at once
+                    with st.spinner("Looking up each item..."):
+                        response = engine.llm_answer(chat.query, chat.intent, api_key=GROQ_API_KEY)
+                else:
+                    for token in engine.stream(chat.query, api_key=GROQ_API_KEY):
+                        response += token
+                        bot_message.markdown(bot_bubble(response), unsafe_allow_html=True)
+            chat_history.set_response(chat, response)
+            bot_message.markdown(bot_bubble(chat.response), unsafe_allow_html=True)
+            streaming += time.perf_counter() - stream_started
+        else:
+            # User message (right bubble) and bot message (left bubble) as one element
+            st.markdown(user_bubble(chat.query) + bot_bubble(chat.response), unsafe_allow_html=True)
 
-
-for chat in reversed(st.session_state.chat_history):
-        # User message (right bubble)
-        st.markdown(
-            f"<div style='text-align: right; background-color: #D1E7DD; padding:10px; border-radius:10px; "
-            f"margin:5px 0 5px auto; width: fit-content; max-width: 80%;'>{chat['query']}</div>",
-            unsafe_allow_html=True
-        )
-        # Bot message (left bubble)
-        st.markdown(
-            f"<div style='text-align: left; background-color: #F0F0F0; padding:10px; border-radius:10px; "
-            f"margin:5px auto 5px 0; width: fit-content; max-width: 80%; overflow-x: auto;'>{chat['response']}</div>",
-            unsafe_allow_html=True
-        )
+older = chat_history.older_count(st.session_state.visible_turns)
+if older:
+    st.button(f"Show older messages ({older} more)", on_click=show_older_turns)
 
 st.markdown("</div>", unsafe_allow_html=True)
-
-
-
-def groq_response(query, json_data):
-    try:
-        client = Groq(api_key=GROQ_API_KEY)
-
-        all_items = json_data.get('items', [])
-
-        # Randomly pick up to 100 unique items
-        sampled_items = random.sample(all_items, min(len(all_items), 100))
-
-        json_text = json.dumps(sampled_items, indent=2)
-
-        system_prompt = f"""
-You are an Inventory Assistant.
-
-Using ONLY this JSON data:
-
-{json_text}
-
-Rules:
-
-Rules:
-
-1. For Inventory Item Descriptions (e.g., "What is Sulphur Olive Green like?"):
-Use fuzzy search in 'description' and reply like this (natural GPT chat form):
-
-Sure! Here are the matching inventory items I found:
-
-• Sulphur Olive Green with a quantity of 120, stock value 3000, and secqty 20.
-
-• Olive Green Dye with a quantity of 80, stock value 2000, and secqty 10.
-
-If ask for bleech list or kind of any listing show 10 records
-
-(Up to 50 results like this.)
-
-If no match:
-
-⚠️ No matching records found.
-
-2. For Category Questions (e.g., "How many categories are there?"):
-There are two categories: Chemicals and Dyes.
-
-3. For Item Count in Categories (e.g., "How many items in chemicals and dyes?"):
-There are 3145 items in Chemicals and 1255 items in Dyes.
-
-4. For Item Costing/High Value (e.g., "What is the high cost stock?"):
-Use stock_value as cost and reply like:
-
-The highest cost item is Sulphur Blue with a stock value of 50,000.
-
-5. For Aging Queries (e.g., "What has aging 60?"):
-If asked "Show items with aging 60", reply GPT-like:
-
-There are some items that have aging 60. A few are given below:
-
-Bleach White has aging 60 and quantity 45.
-
-Olive Green Dye has aging 60 and quantity 120.
-
-Sulphur Blue has aging 60 and quantity 75.
-
-(Max 50 such records)
-
-If none:
-
-⚠️ No matching records found.
-
-6. Strict No Guessing Rule:
-If nothing matches, reply exactly:
-
-⚠️ No matching records found.
-
-7. Fuzzy Handling:
-Supports misspelling, plurals, slang, typos via fuzzy matching.
-
-8. Always GPT-style (conversational), never show labels like:
-yaml
-Copy
-Edit
-Inventory Item ID: 1234  
-Description: Bleach White  
-Quantity: 200
-Instead, say:
-
-Bleach White with a quantity of 200, stock value 5000, and secqty 50.
-
-Do not guess, assume, or fabricate any data not explicitly present. Only respond based on the above instructions.
-"""
-
-
-        completion = client.chat.completions.create(
-            model="meta-llama/llama-4-scout-17b-16e-instruct",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": query}
-            ],
-            temperature=0.2,
-            max_completion_tokens=2048,
-            top_p=1,
-            stream=False,
-        )
-        return completion.choices[0].message.content
-
-    except Exception as e:
-        return f"❌ Groq API Error: {e}"
-
+# Streaming time is already in the "llm" span. The render goes into the trace of
+# the question that triggered this rerun, which is then let go, so later reruns
+# only reach the histogram.
+new_turn = next((turn for _, turn in chat_history.latest(1)), None)
+with TRACER.resume(new_turn.trace if new_turn is not None else None):
+    TRACER.record("render", time.perf_counter() - render_started - streaming)
+if new_turn is not None:
+    new_turn.trace = None
+
+# ----------- Debug Panel --------------
+if st.sidebar.checkbox("🛠 Debug panel", key="debug_panel"):
+    st.sidebar.subheader("Recent queries")
+    for trace in TRACER.recent_traces()[:10]:
+        spans = ", ".join(f"{name} {seconds * 1000:.1f} ms" for name, seconds in trace["spans"].items())
+        st.sidebar.caption(f"**{trace['query'][:40]}** ({trace['intent']}): {spans}")
+    with st.sidebar.expander("Metrics (Prometheus)"):
+        st.code(TRACER.render_prometheus(), language="text")
 
 
 
@@ -262,192 +154,16 @@ def handle_input():
     if user_input == "":
         return
 
-    user_input_lower = user_input.lower()
-
-    # === Calculated Variables ===
-    total_items = len(data)
-    stock_value = sum(float(item.get('stockvalue', 0)) for item in data if item.get('stockvalue'))
-
-    # --- Keyword Buckets ---
-    stock_value_keywords = [
-    "stock value", "stock val", "stockval", "stok value", "stck value", "inventory value", "invntory value", "inv value", "stock worth",
-    "inventory worth", "worth of stock", "inventory money", "stock money", "stok mony", "total stock value", "total value", "tot value", "inv value",
-    "stck val", "Stock Value", "STOCK VALUE", "inv val", "inven val", "value of stock", "cost of stock", "stck worth", "whats my stock worth",
-    "valuation", "stock valuation", "inventory valuation", "stockprice", "stock price", "inventoryprice", "inventory price", "stock price value",
-    "stock money value", "total inven value", "invntry value", "stockworth", "what stock worth", "stock rate", "inventory rate", "stok rate", "inv rate",
-    "rate of stock", "inventory rate value", "asset value", "inventory asset value", "stock asset value", "total asset", "stock total value",
-    "inventory total value", "stok total val", "stock total worth", "inventory total worth", "stok total worth", "stock price list", "inventory price list",
-    "inven price", "list of inventory price", "inventory listing value", "stock listing value", "stock net value", "inventory net value", "net stock worth",
-    "net inven worth", "stock gross value", "inventory gross value", "gross stock worth", "gross inven worth", "market value", "stock market value",
-    "inv market value", "market stock worth", "market inven worth", "valuation stock", "valuation inventory", "worth stock", "worth inven", "stock total money",
-    "inventory total money", "stock funds", "inventory funds", "inventory financials", "stock financials", "stock mony", "inven mony", "valuation mony",
-    "val mony", "asset mony", "valuation fund", "invntry funds", "invntry mony", "stockfund", "inventoryfund", "stockfunds", "inventoryfunds", "stock price check",
-    "inventory price check"
-]
-
-    stock_count_keywords = [
-    "stock count", "stk count", "inventory count", "inv count", "total items", "total itm", "tot items", "how many items", "hw many items",
-    "items count", "item count", "itm count", "number of items", "no of items", "how many itms", "items quantity", "items qty", "total qty",
-    "inventory qty", "stock qty", "no. of items", "no items", "stock number", "inventory number", "num of stock", "number stock", "item stock count",
-    "stock item count", "inv item count", "inv stock count", "how many stk", "stk itm count", "items total", "total inv items", "inv total items",
-    "total stock items", "total inv stock", "inv stock itm", "count of items", "item counts", "itemscounts", "itmcounts", "stockcounts", "stock counts",
-    "inv counts", "inventory counts", "total itm count", "how much items", "how mch items", "quantity of items", "qty items", "item qty", "inventoryqty",
-    "stockqty", "totalstockcount", "invstockcount", "itmstockcount", "itmstockqty", "inventoryquantity", "stockquantity", "qtyofstock", "totalnumofitems",
-    "totalnumberofitems", "stockitemqty", "invitemqty", "stockitmqty", "inventoryitmqty", "stock itms count", "inv itms count", "how many stock",
-    "how many inventory", "stocknum", "inventorynum", "numstock", "numinventory", "totinvitems", "invqty", "stkqty", "stknum", "stkitmnum", "itmnum",
-    "itmqty", "itmval", "totalitmqty", "inventoryitmcount", "stockitmcount", "itmcount", "countstock", "countinventory", "inventoryitm", "stockitm",
-    "howmanyitms", "howmanystk", "howmanyinventory", "numitms", "numstk", "totalitms", "stkcount", "invcount", "itmcounts"
-]
-
-    top_items_keywords = [
-    "top items", "top itm", "top 5", "top five", "top5", "best items", "bset items", "top 10", "top ten", "top 3", "top three", "most used items",
-    "mostused items", "top-used items", "frequent items", "frequently used items", "most popular items", "popular items", "hot items", "best selling items",
-    "hot selling items", "most common items", "trending items", "trend items", "best in stock", "top in stock", "most in stock", "highest stock",
-    "top rated items", "top ranking items", "top ranking", "best ranking", "most selling", "top products", "top prod", "best products", "most used products",
-    "top performing items", "high demand items", "top demanded", "high sale items", "top sale", "top sales", "top sale items", "high in demand",
-    "fast selling", "fast moving items", "fast move items", "bestsellers", "top sellers", "best sellers", "best-selling", "most wanted items",
-    "most searched items", "top search items", "frequently bought items", "fast buy items", "quick sale items", "hotstock", "topstock", "toplisting",
-    "hotlisting", "top stocks", "in-demand items", "top preferred", "fav items", "favorite items", "top fav", "top preference", "preferred items",
-    "faststock", "trendy items", "trendstock", "trenditems", "most required", "best picks", "hot picks", "most liked items", "liked items", "loved items",
-    "most chosen", "chosen items", "chosenstock", "hit items", "top hit", "hottest items", "topfivestock", "topfivethings", "bestinlist", "mostpurchased",
-    "most bought items", "popularstock", "popstock", "topselling", "mostpurchaseditems", "mostbuy", "top10stock", "mostdemanded"
-]
-
-    category_keywords = ["category", "major", "all majors", "types of items", "item types"]
-    chemical_keywords = ["chemical", "chemicals", "chemical items","checmi","Chem","Chechi"]
-    bleach_keywords = ["bleach", "bleaching agents","bleech","bleech list","bleach listing"]
-    fabric_keywords = ["fabric", "fabrics", "fabric types", "textiles", "cloth types"]
-    costing_keywords = ["costing", "cost", "amount", "total cost", "high cost", "high costing", "expensive item", "pricey item"]
-    top_costing_keywords = ["top cost", "top costing", "top 5 cost", "top 5 costing", "high costing items", "expensive items", "top expensive", "high stock value", "high amount"]
-    dye_keywords = ["dye", "dyes"]
-
-    full_response = None  # default response
-
-    # ----- Specific handling for Chemicals only -----
-    if any(keyword in user_input_lower for keyword in chemical_keywords) and not any(keyword in user_input_lower for keyword in dye_keywords):
-        chemical_items = [item for item in data if 'chemical' in item.get('major', '').lower() or 'chemical' in item.get('description', '').lower()]
-
-        if chemical_items:
-            top_chemical = max(chemical_items, key=lambda x: float(x.get('stockvalue', 0)))
-            desc = top_chemical.get('description', 'Unknown')
-            stock_val = top_chemical.get('stockvalue', '0')
-            qty = top_chemical.get('qty', '0')
-            major = top_chemical.get('major', 'Unknown')
-
-            full_response = (
-                f"🧪 The highest stock value chemical is {desc} with a stock value of {stock_val}, "
-                f"quantity {qty}, categorized under {major}."
-            )
-        else:
-            full_response = "❌ No chemical items found."
-
-    # ----- Specific handling for Dyes only -----
-    elif any(keyword in user_input_lower for keyword in dye_keywords) and not any(keyword in user_input_lower for keyword in chemical_keywords):
-        dye_items = [item for item in data if 'dye' in item.get('major', '').lower() or 'dye' in item.get('description', '').lower()]
-
-        if dye_items:
-            top_dye = max(dye_items, key=lambda x: float(x.get('stockvalue', 0)))
-            desc = top_dye.get('description', 'Unknown')
-            stock_val = top_dye.get('stockvalue', '0')
-            qty = top_dye.get('qty', '0')
-            major = top_dye.get('major', 'Unknown')
-
-            full_response = (
-                f"🎨 The highest stock value dye is {desc} with a stock value of {stock_val}, "
-                f"quantity {qty}, categorized under {major}."
-            )
-        else:
-            full_response = "❌ No dye items found."
-
-    # ----- Other Existing Handlers -----
-    elif any(keyword in user_input_lower for keyword in stock_count_keywords):
-        full_response = f"📦 There are currently **{total_items} items** in the inventory."
-
-    elif any(keyword in user_input_lower for keyword in stock_value_keywords):
-        full_response = f"💰 The total value of the entire inventory is **{stock_value}**."
-
-    elif any(keyword in user_input_lower for keyword in top_costing_keywords):
-        costly_items = sorted(
-            [item for item in data if item.get('stockvalue')],
-            key=lambda x: float(x.get('stockvalue', 0)), reverse=True
-        )[:5]
-        if costly_items:
-            full_response = "🏆 Top 5 expensive items:\n\n"
-            for idx, item in enumerate(costly_items, start=1):
-                desc = item.get('description', 'Unknown')
-                stock_val = item.get('stockvalue', '0')
-                qty = item.get('qty', '0')
-                major = item.get('major', 'Unknown')
-                full_response += (
-                    f"{idx}. {desc} has stock value {stock_val}, quantity {qty}, category {major}.\n"
-                )
-        else:
-            full_response = "❌ No costly items found."
-
-    elif any(keyword in user_input_lower for keyword in costing_keywords):
-        costly_items = [item for item in data if item.get('stockvalue')]
-        if costly_items:
-            highest = max(costly_items, key=lambda x: float(x.get('stockvalue', 0)))
-            desc = highest.get('description', 'Unknown')
-            stock_val = highest.get('stockvalue', '0')
-            qty = highest.get('qty', '0')
-            major = highest.get('major', 'Unknown')
-            full_response = (
-                f"💎 The most expensive item is {desc} with a stock value of {stock_val}, quantity {qty}, categorized under {major}."
-            )
-        else:
-            full_response = "❌ No costing data found."
-
-    elif any(keyword in user_input_lower for keyword in top_items_keywords):
-        full_response = "🏆 The following are the top 5 most frequently used items:\n\n"
-        for idx, (desc, count) in enumerate(top_items, start=1):
-            full_response += f"{idx}. {desc} has been used {count} times.\n"
-
-    elif any(keyword in user_input_lower for keyword in category_keywords):
-        full_response = "🗂️ The inventory includes items from the following categories:\n\n"
-        for major, count in major_counts.items():
-            full_response += f"- {major} with {count} items.\n"
-
-    elif any(keyword in user_input_lower for keyword in bleach_keywords):
-        bleach_items = [item for item in data if 'bleach' in item.get('description', '').lower()]
-        count = len(bleach_items)
-        full_response = f"🧼 There are {count} bleach-related items in the inventory.\n\n"
-        if count > 0:
-            full_response += "Here are some examples:\n\n"
-            for idx, item in enumerate(bleach_items[:10], start=1):
-                desc = item.get('description', 'Unknown')
-                stock_val = item.get('stockvalue', '0')
-                qty = item.get('qty', '0')
-                major = item.get('major', 'Unknown')
-                full_response += (
-                    f"{idx}. {desc} has stock value {stock_val}, quantity {qty}, category {major}.\n"
-                )
-        else:
-            full_response += "No bleach items found."
-
-    elif any(keyword in user_input_lower for keyword in fabric_keywords):
-        fabric_items = [item for item in data if 'fabric' in item.get('major', '').lower() or 'fabric' in item.get('description', '').lower()]
-        count = len(fabric_items)
-        full_response = f"🧵 There are {count} fabric-related items in the inventory.\n\n"
-        if count > 0:
-            full_response += "Here are some examples:\n\n"
-            for idx, item in enumerate(fabric_items[:5], start=1):
-                desc = item.get('description', 'Unknown')
-                stock_val = item.get('stockvalue', '0')
-                qty = item.get('qty', '0')
-                major = item.get('major', 'Unknown')
-                full_response += (
-                    f"{idx}. {desc} has stock value {stock_val}, quantity {qty}, category {major}.\n"
-                )
-        else:
-            full_response += "No fabric items found."
-
-    else:
-        # Fallback: Call Groq API
-        full_response = groq_response(user_input, {"items": data})
+    # Answered locally when possible; otherwise the response stays None and
+    # the Groq fallback is streamed into the chat bubble on the rerun. The
+    # callback runs before the rerun, so it asks the watcher for the engine.
+    # The trace is kept on the turn so the rerun's LLM and render spans join it.
+    with TRACER.trace(user_input) as trace:
+        response = inventory.engine.local_answer(user_input)
 
     # Append to chat history
-    st.session_state.chat_history.append({"query": user_input, "response": full_response})
+    st.session_state.chat_history.append(user_input, response.text, response.intent, trace)
+    st.session_state.visible_turns = PAGE_SIZE  # new turn: back to the latest page
     st.session_state.user_input = ""  # clear input
 
 
@@ -0,0 +1,183 @@
+import asyncio
+import os
+import re
+import threading
+import time
+from collections import deque, namedtuple
+
+import numpy as np
+
+from llm import ERROR_PREFIX
+from search_index import STOPWORDS, detect_requested_fields, preprocess
+from timeseries import DATE_PATTERN, find_dates, latest_rows, snapshot_date
+from tracing import TRACER
+
+
+MAX_PARTS = 25
+MATCHES_PER_PART = 3
+REQUESTS_PER_MINUTE = int(os.getenv("GROQ_REQUESTS_PER_MINUTE", "30"))
+# Groq parts in flight at once; by default the whole per-minute budget, so
+# every part of a question (at most MAX_PARTS) starts straight away
+MAX_CONCURRENT_LLM = int(os.getenv("CHATBOT_LLM_CONCURRENCY", str(REQUESTS_PER_MINUTE)))
+# Longest a part waits for the rate limit before it is answered as skipped
+MAX_RATE_WAIT = 2.0
+RATE_LIMITED_ANSWER = f"{ERROR_PREFIX}: request limit for this minute reached, ask again shortly."
+DEFAULT_FIELDS = ["qty", "stockvalue", "major"]
+FIELD_LABELS = {"inventory_item_id": "item id", "fabtype": "fab type", "qty": "quantity", "stockvalue": "stock value",
+                "aging_60": "aging 60", "aging_90": "aging 90", "aging_180": "aging 180", "aging_180plus": "aging 180+"}
+
+LIST_SEPARATORS = re.compile(r'\s*(?:,|;|&|\band\b|\bvs\b\.?|\bversus\b)\s*', re.IGNORECASE)
+HEAD = re.compile(r'^(.*(?:\b(?:compare|between|of|for)\b|:))\s*', re.IGNORECASE)
+DATE_PHRASE = re.compile(r'(?:\b(?:as\s+(?:of|on)|on|at)\s+)?' + DATE_PATTERN.pattern, re.IGNORECASE)
+FILLER = {"item", "items", "product", "products", "these", "those", "id", "ids", "inventory", "stock", "no", "number"}
+
+# `answer` is the local answer, or None when the part goes to the LLM.
+SubQuery = namedtuple('SubQuery', ['label', 'query', 'answer'])
+QueryPlan = namedtuple('QueryPlan', ['query', 'head', 'snapshot_date', 'parts'])
+
+
+# ----------------- Planning -----------------
+# "compare bleach, sulphur olive green and caustic soda" or "stock value of
+# 4047, 4048 and 4124" is split on its list separators into one sub-query per
+# named item. Parts that name inventory items (by id, or by description words
+# that all match) are answered from the in-memory table; the rest become
+# "<head> <part>" questions for the LLM. A question is only planned when at
+# least two parts resolve locally, so ordinary sentences with an "and" in
+# them keep their normal routing.
+def split_parts(query):
+    text = DATE_PHRASE.sub(' ', query).strip().rstrip('?.!')
+    segments = [segment for segment in LIST_SEPARATORS.split(text) if segment.strip()]
+    if len(segments) < 2:
+        return None, []
+    head = ''
+    match = HEAD.match(segments[0])
+    if match:
+        head = match.group(1).rstrip(':').strip()
+        segments[0] = segments[0][match.end():]
+    parts = [segment.strip() for segment in segments if segment.strip()]
+    return head, parts
+
+def part_tokens(part):
+    return [token for token in preprocess(part) if token not in STOPWORDS and token not in FILLER]
+
+def resolve_part(engine, part, date):
+    table = engine.data
+    item_ids = table.index.item_ids()
+    ids = [int(number) for number in re.findall(r'\d+', part) if int(number) in item_ids]
+    if ids:
+        positions = np.concatenate([table.index.rows('inventory_item_id', item_id) for item_id in ids])
+    else:
+        # Descriptions containing the words as written first ("bleach" is
+        # also a fuzzy match for "black"), then every word fuzzily.
+        tokens = part_tokens(part)
+        if not tokens:
+            return None
+        positions = table.index.rows_containing(' '.join(tokens), ['description'])
+        if not len(positions):
+            matches = engine.search_index.search(' '.join(tokens), min_score=len(tokens))
+            positions = np.array([position for position, _ in matches], dtype=np.int64)
+    positions = latest_rows(table, positions, date)
+    if not len(positions):
+        return None
+    return table.top('stockvalue', MATCHES_PER_PART, positions)
+
+def describe_rows(table, positions, fields):
+    lines = []
+    for row in table.rows(positions):
+        values = ", ".join(f"{FIELD_LABELS.get(field, field)} {row.get(field)}" for field in fields)
+        lines.append(f"- {row.get('description')} (item {row.get('inventory_item_id')}): {values}, "
+                     f"as of {snapshot_date(row.get('txndate') or '')}")
+    return "\n".join(lines)
+
+def plan_query(engine, query):
+    dates = find_dates(query)
+    if len(dates) > 1:
+        return None
+    head, parts = split_parts(query)
+    if len(parts) < 2 or len(parts) > MAX_PARTS:
+        return None
+    # "salt and pepper mix" is one description, not two items
+    listed = query.lower()[query.lower().find(parts[0].lower()):]
+    if len(engine.data.index.rows_containing(listed.rstrip('?.! '), ['description'])):
+        return None
+
+    snapshot = engine.series.as_of(dates[-1] if dates else None)
+    if snapshot is None:
+        return None
+    date = engine.series.dates[snapshot]
+    fields = []
+    for field in detect_requested_fields(query):
+        fields.extend(field if isinstance(field, list) else [field])
+    fields = fields or DEFAULT_FIELDS
+
+    sub_queries = []
+    for part in parts:
+        positions = resolve_part(engine, part, date)
+        answer = None if positions is None else describe_rows(engine.data, positions, fields)
+        sub_queries.append(SubQuery(part, f"{head} {part}".strip(), answer))
+    if sum(sub.answer is not None for sub in sub_queries) < 2:
+        return None
+    return QueryPlan(query, head, date, sub_queries)
+
+def needs_llm(plan):
+    return any(sub.answer is None for sub in plan.parts)
+
+def merge_answers(plan, answers):
+    sections = [f"**{sub.label}**\n{answer}" for sub, answer in zip(plan.parts, answers)]
+    return f"🔎 Here is what I found for each of the {len(plan.parts)} items you asked about:\n\n" + "\n\n".join(sections)
+
+
+# ----------------- LLM Fan-out -----------------
+# Process-wide cap on how many Groq requests may start in any rolling minute,
+# shared by every session and event loop. The SDK still retries 429s with
+# backoff on top of this.
+class RateLimiter:
+    def __init__(self, per_minute=REQUESTS_PER_MINUTE):
+        self.per_minute = per_minute
+        self.started = deque()
+        self._lock = threading.Lock()
+
+    def delay(self):
+        # Seconds until another request may start; 0 means a slot was taken.
+        with self._lock:
+            now = time.monotonic()
+            while self.started and now - self.started[0] >= 60:
+                self.started.popleft()
+            if len(self.started) < self.per_minute:
+                self.started.append(now)
+                return 0.0
+            return self.started[0] + 60 - now
+
+    async def acquire(self, max_wait=MAX_RATE_WAIT):
+        # True once a slot is taken; False when none frees up within
+        # `max_wait` seconds, so a caller degrades instead of stalling for
+        # the rest of the window.
+        deadline = time.monotonic() + max_wait
+        while True:
+            wait = self.delay()
+            if not wait:
+                return True
+            if time.monotonic() + wait > deadline:
+                TRACER.count("llm_rate_limited_total")
+                return False
+            await asyncio.sleep(wait)
+
+LLM_RATE_LIMITER = RateLimiter()
+
+async def answer_plan(plan, ask, max_concurrent=MAX_CONCURRENT_LLM, limiter=LLM_RATE_LIMITER):
+    # `ask(query)` returns an awaitable LLM answer. At most `max_concurrent`
+    # run at once, so the wall time is about the slowest sub-query rather
+    # than their sum. Parts the rate limit leaves no room for are answered
+    # with RATE_LIMITED_ANSWER, which is never cached.
+    slots = asyncio.Semaphore(max_concurrent)
+
+    async def run(sub):
+        async with slots:
+            if not await limiter.acquire():
+                return RATE_LIMITED_ANSWER
+            return await ask(sub.query)
+
+    pending = [run(sub) for sub in plan.parts if sub.answer is None]
+    TRACER.count("llm_sub_queries_total", len(pending))
+    llm_answers = iter(await asyncio.gather(*pending))
+    return merge_answers(plan, [sub.answer if sub.answer is not None else next(llm_answers) for sub in plan.parts])
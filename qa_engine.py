@@ -0,0 +1,174 @@
+import json
+import math
+import os
+import re
+import zlib
+from collections import defaultdict, namedtuple
+
+import numpy as np
+
+from inventory import CACHE_DIR, file_digest, write_atomic, write_json_atomic
+from search_index import preprocess
+from timeseries import latest_rows, snapshot_date
+
+
+N_FEATURES = 1 << 18
+CONFIDENCE_THRESHOLD = 0.6
+ITEM_PLACEHOLDER = "itemid"
+FIELD_ANSWER = re.compile(r'^(\w+): ')
+
+OfflineAnswer = namedtuple('OfflineAnswer', ['text', 'confidence', 'source'])
+
+
+# ----------------- Features -----------------
+# Word unigrams/bigrams plus character trigrams of every word, hashed into a
+# fixed number of columns so no vocabulary has to be stored next to the matrix.
+def mask_item_ids(query, item_ids):
+    return re.sub(r'\d+', lambda m: ITEM_PLACEHOLDER if int(m.group()) in item_ids else m.group(), query)
+
+def features(text):
+    tokens = preprocess(text)
+    grams = list(tokens)
+    grams += [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    for token in tokens:
+        padded = f"<{token}>"
+        grams += [f"#{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+    counts = defaultdict(int)
+    for gram in grams:
+        counts[zlib.crc32(gram.encode()) % N_FEATURES] += 1
+    return counts
+
+def tfidf_vector(counts, idf):
+    vector = {feature: (1 + math.log(count)) * idf[feature] for feature, count in counts.items()}
+    norm = math.sqrt(sum(weight * weight for weight in vector.values())) or 1.0
+    return {feature: weight / norm for feature, weight in vector.items()}
+
+
+# ----------------- Question Index -----------------
+# Sparse TF-IDF matrix over the dataset questions, stored column-major
+# (feature -> question ids, weights) so scoring a query only touches the
+# postings of the features it contains.
+class QuestionIndex:
+    def __init__(self, questions, answers, indptr, doc_ids, weights, idf):
+        self.questions = questions
+        self.answers = answers
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.weights = weights
+        self.idf = idf
+
+    @classmethod
+    def build(cls, questions, answers, item_ids):
+        doc_counts = [features(mask_item_ids(question, item_ids)) for question in questions]
+        df = np.zeros(N_FEATURES, dtype=np.float64)
+        for counts in doc_counts:
+            df[list(counts)] += 1
+        idf = (np.log((1 + len(questions)) / (1 + df)) + 1).astype(np.float32)
+
+        postings = defaultdict(list)
+        for doc_id, counts in enumerate(doc_counts):
+            for feature, weight in tfidf_vector(counts, idf).items():
+                postings[feature].append((doc_id, weight))
+
+        indptr = np.zeros(N_FEATURES + 1, dtype=np.int64)
+        for feature, entries in postings.items():
+            indptr[feature + 1] = len(entries)
+        indptr = np.cumsum(indptr)
+        doc_ids = np.empty(indptr[-1], dtype=np.int32)
+        weights = np.empty(indptr[-1], dtype=np.float32)
+        for feature, entries in postings.items():
+            start = indptr[feature]
+            doc_ids[start:start + len(entries)] = [doc_id for doc_id, _ in entries]
+            weights[start:start + len(entries)] = [weight for _, weight in entries]
+        return cls(questions, answers, indptr, doc_ids, weights, idf)
+
+    def save(self, path, version):
+        # The .json carries the version, so it is replaced last: a reader
+        # never sees a current version next to an older or partial .npz.
+        write_atomic(path + '.npz', lambda file: np.savez_compressed(
+            file, indptr=self.indptr, doc_ids=self.doc_ids, weights=self.weights, idf=self.idf), mode='wb')
+        write_json_atomic(path + '.json', {"version": version, "questions": self.questions, "answers": self.answers})
+
+    @classmethod
+    def load(cls, path, version):
+        with open(path + '.json', 'r') as file:
+            stored = json.load(file)
+        if stored["version"] != version:
+            return None
+        with np.load(path + '.npz') as arrays:
+            return cls(stored["questions"], stored["answers"], arrays["indptr"],
+                       arrays["doc_ids"], arrays["weights"], arrays["idf"])
+
+    def nearest(self, query, item_ids):
+        vector = tfidf_vector(features(mask_item_ids(query, item_ids)), self.idf)
+        scores = np.zeros(len(self.questions), dtype=np.float32)
+        for feature, weight in vector.items():
+            start, end = self.indptr[feature], self.indptr[feature + 1]
+            scores[self.doc_ids[start:end]] += weight * self.weights[start:end]
+        if not len(scores):
+            return None, 0.0
+        best = int(np.argmax(scores))
+        return best, float(scores[best])
+
+
+# ----------------- Offline Answer Engine -----------------
+# Answers before the Groq fallback. The closest dataset question says what is
+# being asked; when it is a "field: value" answer and the query names an item
+# id, the value is read from that item's row in the requested snapshot instead
+# of reusing the stored one.
+class OfflineAnswerEngine:
+    def __init__(self, question_index, table, series, threshold=CONFIDENCE_THRESHOLD):
+        self.index = question_index
+        self.table = table
+        self.series = series
+        self.threshold = threshold
+        self.item_ids = table.index.item_ids()
+
+    def answer(self, query, date=None):
+        # Values come from the item's newest row on or before `date` (the
+        # latest snapshot when None); not every item is in every snapshot.
+        best, confidence = self.index.nearest(query, self.item_ids)
+        if best is None:
+            return OfflineAnswer(None, 0.0, None)
+        stored = self.index.answers[best]
+        field = FIELD_ANSWER.match(stored)
+        if field and (field.group(1) in self.table.columns or field.group(1) in self.table.dropped_columns):
+            ids = [int(number) for number in re.findall(r'\d+', query) if int(number) in self.item_ids]
+            if not ids:
+                # The stored value belongs to whatever item the dataset had in
+                # mind, not to anything this query named.
+                return OfflineAnswer(None, 0.0, "dataset")
+            date = date or self.series.dates[-1]
+            rows = latest_rows(self.table, self.table.index.rows('inventory_item_id', ids[0]), date)
+            if not len(rows):
+                return OfflineAnswer(f"❌ Item {ids[0]} has no inventory record on or before {date}.",
+                                     confidence, "inventory")
+            row = self.table.row(rows[0])
+            return OfflineAnswer(f"{field.group(1)}: {row.get(field.group(1))} (as of {snapshot_date(row['txndate'])})",
+                                 confidence, "inventory")
+        return OfflineAnswer(stored, confidence, "dataset")
+
+    def confident_answer(self, query, date=None):
+        result = self.answer(query, date)
+        if result.text is None or result.confidence < self.threshold:
+            return None
+        return result
+
+
+def load_qa_engine(dataset_path, table, series):
+    version = file_digest(dataset_path)
+    name = os.path.splitext(os.path.basename(dataset_path))[0]
+    index_path = os.path.join(os.path.dirname(os.path.abspath(dataset_path)), CACHE_DIR, f"{name}.index")
+    try:
+        question_index = QuestionIndex.load(index_path, version)
+    except Exception:
+        # Missing, stale or damaged (zipfile.BadZipFile, EOFError, ...): rebuild.
+        question_index = None
+
+    if question_index is None:
+        with open(dataset_path, 'r') as file:
+            dataset = json.load(file)
+        question_index = QuestionIndex.build([pair['question'] for pair in dataset],
+                                             [pair['answer'] for pair in dataset], table.index.item_ids())
+        question_index.save(index_path, version)
+    return OfflineAnswerEngine(question_index, table, series)
@@ -0,0 +1,172 @@
+import threading
+import time
+
+from aggregates import aggregates_path
+from engine import InventoryEngine
+from inventory import file_digest, item_signature, iter_items, snapshot_dir, source_signature, write_snapshot
+from tracing import TRACER
+
+
+POLL_INTERVAL = 5.0
+KEY_COLUMNS = ("inventory_item_id", "txndate")
+
+
+def row_key(columns, signature):
+    return tuple(signature[columns.index(column)] for column in KEY_COLUMNS)
+
+def diff_items(rows, items, columns):
+    # Compares a new export against the loaded rows (key -> (position,
+    # signature)). Returns (removed positions, {position: changed item},
+    # added items, {key: signature} of the export), or None when the export
+    # cannot be applied as a delta: a duplicated key, or values in a column
+    # the loaded table does not have.
+    known = set(columns)
+    removed_keys = set(rows)
+    changed = {}
+    added = []
+    signatures = {}
+    for item in items:
+        if any(value is not None and column not in known for column, value in item.items()):
+            return None
+        signature = item_signature(item, columns)
+        key = row_key(columns, signature)
+        if key in signatures:
+            return None
+        signatures[key] = signature
+        loaded = rows.get(key)
+        if loaded is None:
+            added.append(item)
+            continue
+        removed_keys.discard(key)
+        if loaded[1] != signature:
+            changed[loaded[0]] = item
+    removed = sorted(rows[key][0] for key in removed_keys)
+    return removed, changed, added, signatures
+
+
+# ----------------- Inventory Watcher -----------------
+# Picks up new stock exports without a restart. Every poll is one stat() of
+# the file; it is hashed only when its size or mtime moved, and re-read only
+# when the hash differs from the loaded version. The new export is diffed
+# against the loaded rows by (inventory_item_id, txndate) and only the delta
+# is applied, into a new engine that replaces `engine` in one assignment, so a
+# session sees either the old data or the new, never a mix.
+class InventoryWatcher:
+    def __init__(self, path, engine=None, interval=POLL_INTERVAL):
+        self.path = path
+        self.signature = source_signature(path)
+        self.engine = engine if engine is not None else InventoryEngine.load(path)
+        self.interval = interval
+        self.rows = None
+        self.last_refresh = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def row_map(self):
+        # key -> (position, signature) of the loaded rows; None if the loaded
+        # table repeats a key, which only a full reload can handle.
+        if self.rows is None:
+            table = self.engine.data
+            rows = {}
+            for position in range(table.size):
+                signature = table.signature(position)
+                rows[row_key(table.columns, signature)] = (position, signature)
+            self.rows = rows if len(rows) == table.size else None
+        return self.rows
+
+    def check(self):
+        try:
+            signature = source_signature(self.path)
+        except OSError:
+            return False
+        if signature == self.signature:
+            return False
+        with self._lock:
+            if signature == self.signature:
+                return False
+            version = file_digest(self.path)
+            if version == self.engine.version:
+                self.signature = signature
+                return False
+            return self.refresh(signature, version)
+
+    def refresh(self, signature, version):
+        started = time.perf_counter()
+        engine = self.engine
+        rows = self.row_map()
+        items = list(iter_items(self.path))
+        if source_signature(self.path) != signature:
+            # Still being written; the next poll sees the finished file.
+            return False
+
+        delta = None if rows is None else diff_items(rows, items, engine.data.columns)
+        if delta is None:
+            mode = "full"
+            new_engine = InventoryEngine.load(self.path)
+            new_rows = None
+            removed, changed, added = [], {}, items
+        else:
+            mode = "delta"
+            removed, changed, added, signatures = delta
+            new_engine = engine.apply_delta(version, removed, changed, added)
+            new_rows = self.renumber(rows, signatures, removed, added, new_engine.data)
+
+        self.engine = new_engine
+        self.rows = new_rows
+        self.signature = signature
+        seconds = time.perf_counter() - started
+        self.last_refresh = {"mode": mode, "version": version, "removed": len(removed), "changed": len(changed),
+                             "added": len(added), "seconds": seconds, "steps": new_engine.load_times}
+        TRACER.count("inventory_refreshes_total", mode=mode)
+        TRACER.record("refresh", seconds)
+        if mode == "delta":
+            self.persist(new_engine, signature)
+        return True
+
+    def renumber(self, rows, signatures, removed, added, table):
+        # Positions of the new table: survivors keep their order with the
+        # removed rows closed up, added rows follow in export order.
+        shift = 0
+        removed = set(removed)
+        new_position = {}
+        for position in range(len(rows)):
+            if position in removed:
+                shift += 1
+            else:
+                new_position[position] = position - shift
+        first_added = table.size - len(added)
+        added_positions = {row_key(table.columns, item_signature(item, table.columns)): first_added + i
+                           for i, item in enumerate(added)}
+        new_rows = {}
+        for key, signature in signatures.items():
+            loaded = rows.get(key)
+            position = added_positions[key] if loaded is None else new_position[loaded[0]]
+            new_rows[key] = (position, signature)
+        return new_rows
+
+    def persist(self, engine, signature):
+        # Keeps the on-disk caches in step so a restart does not redo the
+        # work; skipped if the file has moved on again in the meantime.
+        if source_signature(self.path) != signature:
+            return
+        engine.aggregates.save(aggregates_path(self.path))
+        write_snapshot(self.path, snapshot_dir(self.path), engine.data)
+
+    # ----------- Background Polling --------------
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="inventory-watcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception:
+                # Keep serving the loaded data; the next poll tries again.
+                TRACER.count("inventory_refresh_errors_total")
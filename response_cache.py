@@ -0,0 +1,131 @@
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from inventory import write_json_atomic
+from search_index import STOPWORDS, preprocess
+
+
+def normalize(query):
+    return [token for token in preprocess(query) if token not in STOPWORDS]
+
+def numbers(tokens):
+    return set(re.findall(r'\d+', ' '.join(tokens)))
+
+def trigrams(tokens):
+    text = f" {' '.join(tokens)} "
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+def jaccard(a, b):
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+# ----------------- Semantic Response Cache -----------------
+# Remembers Groq fallback answers per inventory version. A new query reuses an
+# answer when its normalized tokens are close enough to an earlier query's, but
+# only if both mention exactly the same numbers, since "item 4047" and
+# "item 4048" read alike and must not share an answer.
+class ResponseCache:
+    def __init__(self, path=None, max_size=512, ttl=7 * 24 * 3600, threshold=0.8):
+        self.path = path
+        self.max_size = max_size
+        self.ttl = ttl
+        self.threshold = threshold
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if path:
+            self._load()
+
+    def _entry(self, version, query, response, created):
+        tokens = normalize(query)
+        return {
+            "version": version,
+            "query": query,
+            "response": response,
+            "created": created,
+            "tokens": set(tokens),
+            "numbers": numbers(tokens),
+            "trigrams": trigrams(tokens),
+        }
+
+    def _key(self, version, query):
+        return f"{version}:{' '.join(normalize(query))}"
+
+    def _expired(self, entry, now):
+        return self.ttl is not None and now - entry["created"] > self.ttl
+
+    def similarity(self, entry, tokens, query_numbers, grams):
+        if entry["numbers"] != query_numbers:
+            return 0.0
+        return 0.5 * jaccard(entry["tokens"], tokens) + 0.5 * jaccard(entry["trigrams"], grams)
+
+    def get(self, query, version):
+        now = time.time()
+        tokens = normalize(query)
+        token_set = set(tokens)
+        query_numbers = numbers(tokens)
+        grams = trigrams(tokens)
+        with self._lock:
+            best_key, best_score = None, self.threshold
+            for key, entry in list(self.entries.items()):
+                if self._expired(entry, now):
+                    del self.entries[key]
+                    continue
+                if entry["version"] != version:
+                    continue
+                score = self.similarity(entry, token_set, query_numbers, grams)
+                if score >= best_score:
+                    best_key, best_score = key, score
+            if best_key is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(best_key)
+            return self.entries[best_key]["response"]
+
+    def put(self, query, version, response):
+        with self._lock:
+            key = self._key(version, query)
+            self.entries[key] = self._entry(version, query, response, time.time())
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+            if self.path:
+                self._save()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    # ----------- Persistence --------------
+    def _load(self):
+        try:
+            with open(self.path, 'r') as file:
+                stored = json.load(file)
+        except (OSError, ValueError):
+            return
+        now = time.time()
+        for record in stored:
+            entry = self._entry(record["version"], record["query"], record["response"], record["created"])
+            if not self._expired(entry, now):
+                self.entries[self._key(entry["version"], entry["query"])] = entry
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def _save(self):
+        records = [
+            {field: entry[field] for field in ("version", "query", "response", "created")}
+            for entry in self.entries.values()
+        ]
+        write_json_atomic(self.path, records)
@@ -0,0 +1,179 @@
+import re
+from collections import defaultdict
+from difflib import SequenceMatcher
+
+
+STOPWORDS = {
+    "a", "about", "all", "an", "and", "any", "are", "do", "does", "for", "give", "have", "how", "i", "in",
+    "is", "it", "like", "list", "me", "much", "my", "of", "on", "please", "pls", "show", "tell", "the",
+    "there", "to", "we", "what", "whats", "which", "with",
+}
+
+
+# ----------------- NLP Functions -----------------
+def preprocess(text):
+    text = text.lower()
+    text = re.sub(r'[^a-z0-9\s]', '', text)
+    return text.split()
+
+def char_keys(token):
+    seen = defaultdict(int)
+    keys = []
+    for char in token:
+        keys.append((char, seen[char]))
+        seen[char] += 1
+    return keys
+
+def detect_requested_fields(query):
+    possible_fields = {
+        "inventory id": "inventory_item_id",
+        "description": "description",
+        "major": "major",
+        "fab type": "fabtype",
+        "qty": "qty",
+        "quantity": "qty",
+        "stock value": "stockvalue",
+        "aging": ["aging_60", "aging_90", "aging_180", "aging_180plus"]
+    }
+    detected = []
+    for key, val in possible_fields.items():
+        if key in query.lower():
+            detected.append(val)
+    return detected
+
+def item_search_text(item):
+    return f"{item.get('description', '')} {item.get('major', '')} {item.get('fabtype', '')}"
+
+
+# ----------------- Fuzzy Search Index -----------------
+# Built once per dataset. A query token is resolved against the vocabulary of
+# distinct item tokens (same test as get_close_matches with cutoff 0.7), then
+# items are scored by merging the postings of every resolved token, which
+# gives the same scores as counting, for each item, the query tokens with a
+# get_close_matches hit among its tokens.
+#
+# Character postings are keyed on (char, nth occurrence), so one pass over the
+# query's postings yields the multiset overlap that quick_ratio() computes for
+# every vocabulary token at once. That overlap bounds ratio() from above, so only
+# the survivors need a SequenceMatcher.
+class FuzzySearchIndex:
+    MAX_RESOLVED = 4096
+
+    def __init__(self, items, cutoff=0.7):
+        self.cutoff = cutoff
+        self.size = 0
+        self.postings = {}
+        self.char_postings = defaultdict(list)
+        self._resolved = {}
+
+        postings = defaultdict(list)
+        for position, item in enumerate(items):
+            for token in set(preprocess(item_search_text(item))):
+                postings[token].append(position)
+            self.size += 1
+
+        for token, positions in postings.items():
+            self.postings[token] = frozenset(positions)
+            for key in char_keys(token):
+                self.char_postings[key].append(token)
+
+    def updated(self, removed, added, old_to_new=None, size=None):
+        # A new index after a delta; this one is left untouched for readers
+        # still using it. `removed` maps old positions to the items whose
+        # tokens go away (dropped and changed rows), `added` maps new positions
+        # to the items whose tokens come in. Only the touched tokens are
+        # re-tokenized; positions are renumbered only when rows were dropped.
+        index = FuzzySearchIndex.__new__(FuzzySearchIndex)
+        index.cutoff = self.cutoff
+        index.size = self.size if size is None else size
+        index._resolved = {}
+
+        drop = defaultdict(set)
+        for position, item in removed.items():
+            for token in set(preprocess(item_search_text(item))):
+                drop[token].add(position)
+        gain = defaultdict(set)
+        for position, item in added.items():
+            for token in set(preprocess(item_search_text(item))):
+                gain[token].add(position)
+
+        renumber = old_to_new is not None and bool((old_to_new < 0).any())
+        mapping = old_to_new.tolist() if renumber else None
+        postings = dict(self.postings)
+        for token in (self.postings if renumber else drop):
+            positions = postings[token] - drop[token] if token in drop else postings[token]
+            if renumber:
+                positions = frozenset(mapping[position] for position in positions)
+            postings[token] = positions
+        for token, positions in gain.items():
+            postings[token] = postings.get(token, frozenset()) | positions
+
+        index.postings = {}
+        index.char_postings = defaultdict(list, {key: tokens for key, tokens in self.char_postings.items()})
+        gone = set()
+        for token, positions in postings.items():
+            if positions:
+                index.postings[token] = positions
+            else:
+                gone.add(token)
+        for token in gain:
+            if token not in self.postings:
+                for key in char_keys(token):
+                    index.char_postings[key] = index.char_postings[key] + [token]
+        for token in gone:
+            if token in self.postings:
+                for key in char_keys(token):
+                    index.char_postings[key] = [other for other in index.char_postings[key] if other != token]
+        return index
+
+    def resolve(self, q_token):
+        resolved = self._resolved.get(q_token)
+        if resolved is not None:
+            return resolved
+
+        overlap = defaultdict(int)
+        for key in char_keys(q_token):
+            for token in self.char_postings.get(key, ()):
+                overlap[token] += 1
+
+        matches = []
+        s = SequenceMatcher()
+        s.set_seq2(q_token)
+        q_len = len(q_token)
+        for token, common in overlap.items():
+            if 2.0 * common / (len(token) + q_len) < self.cutoff:
+                continue
+            s.set_seq1(token)
+            if s.ratio() >= self.cutoff:
+                matches.append(token)
+
+        resolved = tuple(matches)
+        if len(self._resolved) >= self.MAX_RESOLVED:
+            self._resolved.clear()
+        self._resolved[q_token] = resolved
+        return resolved
+
+    def matching_positions(self, q_token):
+        resolved = self.resolve(q_token)
+        if len(resolved) == 1:
+            return self.postings[resolved[0]]
+        positions = set()
+        for token in resolved:
+            positions.update(self.postings[token])
+        return positions
+
+    def score(self, query_tokens):
+        scores = defaultdict(int)
+        for q_token in query_tokens:
+            for position in self.matching_positions(q_token):
+                scores[position] += 1
+        return scores
+
+    def search(self, query, min_score=1):
+        scores = self.score(preprocess(query))
+        if min_score <= 0:
+            ranked = [(position, scores.get(position, 0)) for position in range(self.size)]
+        else:
+            ranked = sorted((position, score) for position, score in scores.items() if score >= min_score)
+        ranked.sort(key=lambda x: x[1], reverse=True)
+        return ranked
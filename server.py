@@ -0,0 +1,142 @@
+import argparse
+import asyncio
+import json
+import os
+from http import HTTPStatus
+
+from dotenv import load_dotenv
+
+from refresh import InventoryWatcher
+from llm import create_async_client
+from tracing import TRACER
+
+
+MAX_BODY = 64 * 1024
+MAX_CONCURRENT_ANSWERS = 32
+
+
+# ----------------- HTTP Endpoint -----------------
+# A small asyncio HTTP/1.1 server with keep-alive, so no web framework is
+# needed next to Streamlit:
+#   POST /answer  {"query": "..."}  ->  {"query", "response", "intent", "snapshot_date"}
+#   GET  /health                    ->  {"status": "ok", "version": ...}
+#   GET  /metrics                   ->  counters and span histograms, Prometheus text format
+# Local answers run inline; LLM fallbacks are awaited on one shared async
+# client, so slow Groq calls never hold up other requests. Each request reads
+# the watcher's current engine once.
+class AnswerServer:
+    def __init__(self, watcher, api_key=None, max_concurrent=MAX_CONCURRENT_ANSWERS):
+        self.watcher = watcher
+        self.api_key = api_key
+        self.max_concurrent = max_concurrent
+        self.client = None
+        self.slots = None
+
+    async def answer(self, query):
+        async with self.slots:
+            return await self.watcher.engine.answer_async(query, client=self.client)
+
+    async def route(self, method, path, body):
+        if method == "GET" and path == "/health":
+            return HTTPStatus.OK, {"status": "ok", "version": self.watcher.engine.version}
+        if method == "GET" and path == "/metrics":
+            return HTTPStatus.OK, TRACER.render_prometheus()
+        if path != "/answer":
+            return HTTPStatus.NOT_FOUND, {"error": f"unknown path {path}"}
+        if method != "POST":
+            return HTTPStatus.METHOD_NOT_ALLOWED, {"error": "use POST"}
+        try:
+            query = json.loads(body or b"{}").get("query")
+        except (ValueError, AttributeError):
+            query = None
+        if not isinstance(query, str) or not query.strip():
+            return HTTPStatus.BAD_REQUEST, {"error": "body must be JSON with a non-empty \"query\""}
+        response = await self.answer(query)
+        return HTTPStatus.OK, {"query": query, "response": response.text,
+                               "intent": response.intent, "snapshot_date": response.snapshot_date}
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, path, version = request_line.decode('latin-1').split(' ', 2)
+                except ValueError:
+                    method = None
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                try:
+                    length = int(headers.get("content-length", 0))
+                except ValueError:
+                    length = -1
+                # A request we cannot frame still gets an answer before the
+                # connection is closed.
+                if method is None or length < 0:
+                    status, payload = HTTPStatus.BAD_REQUEST, {"error": "malformed request line or Content-Length"}
+                    keep_alive = False
+                elif length > MAX_BODY:
+                    status, payload = HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {"error": "request body too large"}
+                    keep_alive = False
+                else:
+                    body = await reader.readexactly(length) if length else b""
+                    try:
+                        status, payload = await self.route(method, path.split('?', 1)[0], body)
+                    except Exception as e:
+                        status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": str(e)}
+                    keep_alive = (headers.get("connection", "").lower() != "close"
+                                  and version.strip() == "HTTP/1.1")
+
+                if isinstance(payload, str):
+                    content_type, content = "text/plain; version=0.0.4", payload.encode()
+                else:
+                    content_type, content = "application/json", json.dumps(payload, ensure_ascii=False).encode()
+                writer.write(
+                    f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                    f"Content-Type: {content_type}; charset=utf-8\r\n"
+                    f"Content-Length: {len(content)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1') + content
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ValueError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host, port):
+        self.client = create_async_client(self.api_key)
+        self.slots = asyncio.Semaphore(self.max_concurrent)
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"Serving inventory answers on http://{host}:{port}/answer")
+        async with server:
+            await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HTTP endpoint for the inventory chatbot")
+    parser.add_argument("--stock-file", default=os.path.join(os.getcwd(), 'cust_stock.json'))
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--max-concurrent", type=int, default=MAX_CONCURRENT_ANSWERS)
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    watcher = InventoryWatcher(args.stock_file).start()
+    server = AnswerServer(watcher, os.getenv("GROQ_API_KEY"), args.max_concurrent)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+import bisect
+import re
+
+import numpy as np
+
+from inventory import NUMERIC_COLUMNS
+
+
+DATE_PATTERN = re.compile(r'\b(\d{4})-(\d{1,2})(?:-(\d{1,2}))?\b')
+AVERAGE_PATTERN = re.compile(r'\b(?:average|avg|mean)\b', re.IGNORECASE)
+
+
+def find_dates(text, month_start=False):
+    # "2022-03-30" is taken as that day; "2022-03" as the end of that month, or
+    # with `month_start` as its first day (where a range begins).
+    dates = []
+    for year, month, day in DATE_PATTERN.findall(text):
+        dates.append(f"{year}-{int(month):02d}-{int(day) if day else 1 if month_start else 31:02d}")
+    return dates
+
+def snapshot_date(txndate):
+    return txndate[:10]
+
+def latest_rows(table, positions, date=None):
+    # The newest row on or before `date` (None: the newest of all) for every
+    # item among `positions`.
+    txndates = table.categorical['txndate']
+    code_dates = np.array([snapshot_date(txndate) for txndate in txndates.categories])
+    positions = np.asarray(positions, dtype=np.int64)
+    if date is not None:
+        positions = positions[code_dates[txndates.codes[positions]] <= date]
+    if not len(positions):
+        return positions
+    items = table['inventory_item_id'][positions]
+    order = np.lexsort((code_dates[txndates.codes[positions]], items))
+    last = np.append(items[order][1:] != items[order][:-1], True)
+    return np.sort(positions[order][last])
+
+
+# ----------------- Snapshot Series -----------------
+# cust_stock.json holds one full stock listing per txndate. Rows are grouped by
+# date once; per-date totals, row counts and per-major counts are kept as dense
+# arrays in date order, together with running (prefix) sums, so "latest",
+# "as of X", "change between X and Y" and period averages are a bisect plus a
+# few array reads.
+class SnapshotSeries:
+    def __init__(self, table):
+        self.table = table
+        txndates = table.categorical['txndate']
+        order = sorted(range(len(txndates.categories)), key=lambda code: txndates.categories[code])
+        self.txndates = [txndates.categories[code] for code in order]
+        self.dates = [snapshot_date(txndate) for txndate in self.txndates]
+        position = np.empty(len(order), dtype=np.int32)
+        position[order] = np.arange(len(order))
+        date_of_row = position[txndates.codes]
+        n_dates = len(self.dates)
+
+        self.rows = [table.index.rows('txndate', txndate) for txndate in self.txndates]
+        self.counts = np.bincount(date_of_row, minlength=n_dates)
+        self.totals = {}
+        self.prefix = {}
+        for column in NUMERIC_COLUMNS:
+            if column in table.numeric:
+                values = np.nan_to_num(table.numeric[column])
+                self.totals[column] = np.bincount(date_of_row, weights=values, minlength=n_dates)
+                self.prefix[column] = np.concatenate([[0.0], np.cumsum(self.totals[column])])
+
+        majors = table.categorical['major']
+        self.majors = majors.categories
+        self.major_counts = np.zeros((n_dates, len(self.majors)), dtype=np.int64)
+        np.add.at(self.major_counts, (date_of_row, majors.codes), 1)
+
+    def __len__(self):
+        return len(self.dates)
+
+    # ----------- Date Resolution --------------
+    def latest(self):
+        return len(self.dates) - 1 if self.dates else None
+
+    def as_of(self, date=None):
+        # Index of the last snapshot taken on or before `date`.
+        if date is None:
+            return self.latest()
+        index = bisect.bisect_right(self.dates, date) - 1
+        return index if index >= 0 else None
+
+    # ----------- Queries --------------
+    def total(self, column, date=None):
+        index = self.as_of(date)
+        return None if index is None else float(self.totals[column][index])
+
+    def item_count(self, date=None):
+        index = self.as_of(date)
+        return None if index is None else int(self.counts[index])
+
+    def category_counts(self, date=None):
+        index = self.as_of(date)
+        if index is None:
+            return {}
+        return {major: int(count) for major, count in zip(self.majors, self.major_counts[index]) if count}
+
+    def change(self, column, start, end):
+        first, last = self.as_of(start), self.as_of(end)
+        if first is None or last is None:
+            return None
+        before, after = float(self.totals[column][first]), float(self.totals[column][last])
+        return self.dates[first], before, self.dates[last], after, after - before
+
+    def average(self, column, start, end):
+        # Mean over the snapshots taken between `start` and `end` inclusive,
+        # with the first and last snapshot dates used and their count.
+        first, last = bisect.bisect_left(self.dates, start), self.as_of(end)
+        if last is None or last < first:
+            return None
+        count = last - first + 1
+        mean = float((self.prefix[column][last + 1] - self.prefix[column][first]) / count)
+        return self.dates[first], self.dates[last], count, mean
+
+    def snapshot_rows(self, date=None, rows=None):
+        # Row positions of one snapshot, optionally restricted to `rows`.
+        index = self.as_of(date)
+        if index is None:
+            return np.empty(0, dtype=np.int32)
+        if rows is None:
+            return self.rows[index]
+        return np.intersect1d(self.rows[index], rows, assume_unique=True)
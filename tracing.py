@@ -0,0 +1,152 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+
+SPAN_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0)
+RECENT_TRACES = 50
+METRIC_PREFIX = "chatbot"
+
+_current_trace = ContextVar('current_trace', default=None)
+
+
+class Trace:
+    __slots__ = ('query', 'started', 'spans', 'intent')
+
+    def __init__(self, query):
+        self.query = query
+        self.started = time.time()
+        self.spans = []
+        self.intent = None
+
+    def to_dict(self):
+        spans = {}
+        for name, seconds in self.spans:
+            spans[name] = spans.get(name, 0.0) + seconds
+        return {"query": self.query, "started": self.started, "intent": self.intent, "spans": spans}
+
+
+# ----------------- Tracer -----------------
+# Per-query traces of timed spans plus process-wide counters and span
+# histograms. The active trace lives in a context variable, so spans opened
+# anywhere below `trace()` (engine, llm, Streamlit rerun, asyncio task) land in
+# the right query. Recording is a perf_counter pair and a few dict updates
+# under one lock; with tracing disabled the span helpers do nothing.
+class Tracer:
+    def __init__(self, enabled=True, keep=RECENT_TRACES):
+        self.enabled = enabled
+        self.counters = defaultdict(float)
+        self.span_counts = defaultdict(lambda: [0] * (len(SPAN_BUCKETS) + 1))
+        self.span_sums = defaultdict(float)
+        self.recent = deque(maxlen=keep)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def trace(self, query):
+        # Nested calls join the trace that is already open.
+        if not self.enabled or _current_trace.get() is not None:
+            yield _current_trace.get()
+            return
+        trace = Trace(query)
+        token = _current_trace.set(trace)
+        try:
+            yield trace
+        finally:
+            _current_trace.reset(token)
+            with self._lock:
+                self.recent.append(trace)
+
+    @contextmanager
+    def resume(self, trace):
+        # Re-enters a trace opened earlier, such as the one a Streamlit
+        # callback opened before the rerun that streams its answer. It is
+        # already in `recent`, so later spans simply extend it.
+        if not self.enabled or trace is None:
+            yield trace
+            return
+        token = _current_trace.set(trace)
+        try:
+            yield trace
+        finally:
+            _current_trace.reset(token)
+
+    @contextmanager
+    def span(self, name):
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def record(self, name, seconds):
+        if not self.enabled:
+            return
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.spans.append((name, seconds))
+        with self._lock:
+            self.span_counts[name][bisect_left(SPAN_BUCKETS, seconds)] += 1
+            self.span_sums[name] += seconds
+
+    def count(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[(name, tuple(sorted(labels.items())))] += value
+
+    def tag(self, intent):
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.intent = intent
+
+    def recent_traces(self):
+        with self._lock:
+            return [trace.to_dict() for trace in reversed(self.recent)]
+
+    # ----------- Prometheus Text Format --------------
+    def render_prometheus(self):
+        with self._lock:
+            counters = sorted(self.counters.items())
+            spans = sorted((name, list(counts), self.span_sums[name]) for name, counts in self.span_counts.items())
+
+        lines = []
+        typed = set()
+        for (name, labels), value in counters:
+            metric = f"{METRIC_PREFIX}_{name}"
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} counter")
+                typed.add(metric)
+            lines.append(f"{metric}{format_labels(labels)} {format_value(value)}")
+
+        metric = f"{METRIC_PREFIX}_span_seconds"
+        if spans:
+            lines.append(f"# TYPE {metric} histogram")
+        for name, counts, total in spans:
+            cumulative = 0
+            for bound, count in zip(SPAN_BUCKETS + (float('inf'),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float('inf') else format_value(bound)
+                lines.append(f'{metric}_bucket{format_labels((("span", name), ("le", le)))} {cumulative}')
+            lines.append(f'{metric}_sum{format_labels((("span", name),))} {format_value(total)}')
+            lines.append(f'{metric}_count{format_labels((("span", name),))} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + "}"
+
+def format_value(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+TRACER = Tracer(enabled=os.getenv("CHATBOT_TRACING", "1") != "0")